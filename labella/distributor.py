@@ -7,10 +7,11 @@ Author: G.J.J. van den Burg
 License: Apache-2.0
 """
 
+import heapq
 
 from math import ceil
 
-from intervaltree import IntervalTree
+from .node import NodeArray
 
 DEFAULT_OPTIONS = {
     "algorithm": "overlap",
@@ -18,6 +19,8 @@ DEFAULT_OPTIONS = {
     "density": 0.75,
     "nodeSpacing": 3,
     "stubWidth": 1,
+    "maxLayers": None,
+    "weakLinks": False,
 }
 
 
@@ -28,6 +31,11 @@ class Distributor(object):
         self.options = {k: v for k, v in DEFAULT_OPTIONS.items()}
         self.options.update(options)
 
+    def createStub(self, node):
+        return node.createStub(
+            self.options["stubWidth"], weak=self.options["weakLinks"]
+        )
+
     def computeRequiredWidth(self, nodes):
         total = 0
         for node in nodes:
@@ -38,18 +46,64 @@ class Distributor(object):
     def maxWidthPerLayer(self):
         return self.options["density"] * self.options["layerWidth"]
 
-    def needToSplit(self, nodes):
-        return self.estimateRequiredLayers(nodes) > 1
+    def needToSplit(self, nodes, width=None):
+        return self.estimateRequiredLayers(nodes, width=width) > 1
 
-    def estimateRequiredLayers(self, nodes):
+    def estimateRequiredLayers(self, nodes, width=None):
+        """Number of layers needed to fit the nodes in layers of at most
+        maxWidthPerLayer. The width can be given if it is already known,
+        otherwise it is computed with :meth:`computeRequiredWidth`."""
         if self.options["layerWidth"]:
-            return ceil(
-                self.computeRequiredWidth(nodes) / self.maxWidthPerLayer()
-            )
+            if width is None:
+                width = self.computeRequiredWidth(nodes)
+            return ceil(width / self.maxWidthPerLayer())
         else:
             return 1
 
+    def estimate_layers(self, nodes):
+        """Return the number of layers that :meth:`distribute` uses for the
+        nodes, without creating any layers or stubs. For the ``overlap``
+        algorithm this is a lower bound."""
+        if not nodes:
+            return 0
+        if (self.options["algorithm"] == "none") or (
+            not "algorithm" in self.options
+        ):
+            return 1
+        numLayers = self.estimateRequiredLayers(nodes)
+        if numLayers <= 1:
+            return 1
+        if self.options["algorithm"] == "partition":
+            return self.partitionDepth(nodes)
+        if self.options["algorithm"] == "roundRobin":
+            nodes = sorted(nodes, key=lambda x: x.idealPos)
+            return max(self.roundRobinIndices(nodes)) + 1
+        return numLayers
+
+    def partitionDepth(self, nodes):
+        """Number of layers used by :meth:`algorithm_partition`, capped at
+        the maxLayers option."""
+        spacing = self.options["nodeSpacing"]
+        # visit the nodes in the same order as distribute and the algorithm
+        nodes = sorted(nodes, key=lambda x: x.idealPos)
+        nodes.sort(key=lambda x: x.idealLeft())
+        busy = []
+        depth = 0
+        for node in nodes:
+            left = node.idealLeft()
+            while busy and busy[0] <= left:
+                heapq.heappop(busy)
+            heapq.heappush(busy, node.idealRight() + spacing)
+            depth = max(depth, len(busy))
+        maxLayers = self.options["maxLayers"]
+        if not maxLayers is None:
+            depth = min(depth, maxLayers)
+        return depth
+
     def distribute(self, nodes):
+        if isinstance(nodes, NodeArray):
+            # the stubs are added to the container
+            nodes = list(nodes)
         if not nodes or len(nodes) == 0:
             return []
         if (self.options["algorithm"] == "none") or (
@@ -59,7 +113,7 @@ class Distributor(object):
 
         nodes = sorted(nodes, key=lambda x: x.idealPos)
 
-        if not self.needToSplit(nodes):
+        if not self.needToSplit(nodes, width=self.computeRequiredWidth(nodes)):
             return [nodes]
 
         if self.options["algorithm"] == "simple":
@@ -68,6 +122,8 @@ class Distributor(object):
             return self.algorithm_roundRobin(nodes)
         elif self.options["algorithm"] == "overlap":
             return self.algorithm_overlap(nodes)
+        elif self.options["algorithm"] == "partition":
+            return self.algorithm_partition(nodes)
         else:
             raise ValueError(self.options["algorithm"])
 
@@ -83,13 +139,88 @@ class Distributor(object):
 
             stub = node
             for j in range(mod - 1, -1, -1):
-                stub = stub.createStub(self.options["stubWidth"])
+                stub = self.createStub(stub)
                 layers[j].append(stub)
 
         return layers
 
     def algorithm_roundRobin(self, nodes):
+        """Put every node in the first layer in which it does not overlap the
+        last node, or else in the layer that ends first, taking turns on ties.
+        Layers that are left empty are not returned."""
+        indices = self.roundRobinIndices(nodes)
+        layers = []
+        for i in range(max(indices) + 1):
+            layers.append([])
+
+        for node, chosen in zip(nodes, indices):
+            layers[chosen].append(node)
+
+            stub = node
+            for j in range(chosen - 1, -1, -1):
+                stub = self.createStub(stub)
+                layers[j].append(stub)
+
+        return layers
+
+    def roundRobinIndices(self, nodes):
+        """Layer index of every node in :meth:`algorithm_roundRobin`"""
+        numLayers = self.estimateRequiredLayers(nodes)
+        spacing = self.options["nodeSpacing"]
+        ends = [float("-inf")] * numLayers
+
+        indices = []
+        turn = 0
+        for node in nodes:
+            left = node.idealLeft()
+            chosen = None
+            for k in range(numLayers):
+                if ends[k] <= left:
+                    chosen = k
+                    break
+            if chosen is None:
+                chosen = turn
+                for k in range(1, numLayers):
+                    candidate = (turn + k) % numLayers
+                    if ends[candidate] < ends[chosen]:
+                        chosen = candidate
+                turn = (chosen + 1) % numLayers
+
+            indices.append(chosen)
+            ends[chosen] = node.idealRight() + spacing
+        return indices
+
+    def algorithm_partition(self, nodes):
+        """Put the nodes in the smallest number of layers in which they do not
+        overlap. With the maxLayers option, nodes that do not fit in that many
+        layers go to the layer that ends first."""
+        spacing = self.options["nodeSpacing"]
+        maxLayers = self.options["maxLayers"]
         layers = []
+        busy = []
+        free = []
+
+        nodes = sorted(nodes, key=lambda x: x.idealLeft())
+        for seq, node in enumerate(nodes):
+            left = node.idealLeft()
+            while busy and busy[0][0] <= left:
+                heapq.heappush(free, heapq.heappop(busy)[2])
+            if free:
+                layer = heapq.heappop(free)
+            elif maxLayers is None or len(layers) < maxLayers:
+                layer = len(layers)
+                layers.append([])
+            else:
+                layer = heapq.heappop(busy)[2]
+            end = node.idealRight() + spacing
+            heapq.heappush(busy, (end, seq, layer))
+
+            layers[layer].append(node)
+            stub = node
+            for j in range(layer - 1, -1, -1):
+                stub = self.createStub(stub)
+                layers[j].append(stub)
+
         return layers
 
     def algorithm_overlap(self, nodes):
@@ -100,36 +231,12 @@ class Distributor(object):
         puntedWidth = self.computeRequiredWidth(puntedNodes)
 
         while puntedWidth > maxWidth:
-            self.countIdealOverlaps(puntedNodes)
-
-            nodesInCurrentLayer = puntedNodes[:]
-            currentLayerWidth = puntedWidth
-            puntedNodes = []
-
-            while (
-                len(nodesInCurrentLayer) > 2 and currentLayerWidth > maxWidth
-            ):
-                # Sort by overlaps
-                nodesInCurrentLayer.sort(
-                    key=lambda x: x.overlapCount, reverse=True
-                )
-
-                # Remove the node with the most overlap
-                first = nodesInCurrentLayer.pop(0)
+            overlaps = self.countIdealOverlaps(puntedNodes)
 
-                # Update width
-                currentLayerWidth -= first.width
-                currentLayerWidth += self.options["stubWidth"]
-
-                # Update overlap count for the remaining nodes
-                for node in first.overlaps:
-                    node.overlapCount -= 1
-
-                puntedNodes.append(first)
-
-            layers.append(nodesInCurrentLayer)
-
-            puntedWidth = self.computeRequiredWidth(puntedNodes)
+            layer, puntedNodes, puntedWidth = self.puntOverlapping(
+                puntedNodes, overlaps, puntedWidth, maxWidth
+            )
+            layers.append(layer)
 
         if len(puntedNodes) > 0:
             layers.append(puntedNodes)
@@ -147,17 +254,111 @@ class Distributor(object):
                 # Create one stub for each layer above it
                 stub = node
                 for j in range(i - 1, -1, -1):
-                    stub = stub.createStub(self.options["stubWidth"])
+                    stub = self.createStub(stub)
                     layers[j].append(stub)
 
         return layers
 
-    def countIdealOverlaps(self, nodes):
-        iTree = IntervalTree()
-        for node in nodes:
-            iTree.addi(node.idealLeft(), node.idealRight(), data=node)
+    def puntOverlapping(self, nodes, overlaps, width, maxWidth):
+        """Punt the nodes with the most overlaps, as given by
+        :meth:`countIdealOverlaps`, until the rest fit in maxWidth or only two
+        are left. Returns the remaining nodes, the punted nodes and the
+        required width of the punted nodes."""
+        n = len(nodes)
+        indptr, indices = overlaps
+        counts = [node.overlapCount for node in nodes]
+        # Ties are broken as a stable sort on the counts before every punt
+        # would: a node that just lost an overlap comes first in its count.
+        keys = list(range(n))
+        heap = [(-counts[i], i, i) for i in range(n)]
+        heapq.heapify(heap)
+
+        remaining = [True] * n
+        numRemaining = n
+        punted = []
+        puntedTotal = 0
+        previous = {}
+        seq = 0
+        while numRemaining > 2 and width > maxWidth:
+            _, key, i = heapq.heappop(heap)
+            if key != keys[i]:
+                continue
+
+            # Remove the node with the most overlap
+            first = nodes[i]
+            remaining[i] = False
+            numRemaining -= 1
+            punted.append(first)
+
+            # Update width
+            width -= first.width
+            width += self.options["stubWidth"]
+            puntedTotal += first.width + self.options["nodeSpacing"]
+
+            # Update overlap count for the remaining nodes
+            changed = []
+            for j in indices[indptr[i] : indptr[i + 1]]:
+                nodes[j].overlapCount -= 1
+                if remaining[j]:
+                    changed.append(j)
+            previous = {j: (counts[j], keys[j]) for j in changed}
+            for j in sorted(changed, key=lambda j: keys[j], reverse=True):
+                seq -= 1
+                counts[j] -= 1
+                keys[j] = seq
+                heapq.heappush(heap, (-counts[j], seq, j))
+
+        puntedWidth = puntedTotal - self.options["nodeSpacing"]
+        if not punted:
+            return nodes[:], punted, puntedWidth
+
+        # The layer is in the order of the last sort, which was before the
+        # last update of the overlap counts.
+        for j, (count, key) in previous.items():
+            counts[j], keys[j] = count, key
+        kept = [i for i in range(n) if remaining[i]]
+        kept.sort(key=lambda i: (-counts[i], keys[i]))
+        return [nodes[i] for i in kept], punted, puntedWidth
 
-        for node in nodes:
-            overlaps = iTree.overlap(node.idealLeft(), node.idealRight())
-            node.overlaps = [x.data for x in overlaps]
-            node.overlapCount = len(overlaps)
+    def countIdealOverlaps(self, nodes):
+        """Set the overlapCount of every node to the number of ideal intervals
+        that overlap its own, including itself, and return the overlapping
+        nodes as (indptr, indices) in compressed sparse row form."""
+        n = len(nodes)
+        lefts = [node.idealLeft() for node in nodes]
+        rights = [node.idealRight() for node in nodes]
+        order = sorted(range(n), key=lefts.__getitem__)
+
+        # Every interval overlaps with itself, unless it is empty
+        counts = [1 if lefts[i] < rights[i] else 0 for i in range(n)]
+        first = []
+        second = []
+        for p, i in enumerate(order):
+            right = rights[i]
+            for q in range(p + 1, n):
+                j = order[q]
+                if lefts[j] >= right:
+                    break
+                first.append(i)
+                second.append(j)
+                counts[i] += 1
+                counts[j] += 1
+
+        indptr = [0] * (n + 1)
+        for i in range(n):
+            indptr[i + 1] = indptr[i] + counts[i]
+        indices = [0] * indptr[n]
+        fill = indptr[:n]
+        for i in range(n):
+            if lefts[i] < rights[i]:
+                indices[fill[i]] = i
+                fill[i] += 1
+        for i, j in zip(first, second):
+            indices[fill[i]] = j
+            fill[i] += 1
+            indices[fill[j]] = i
+            fill[j] += 1
+
+        for node, count in zip(nodes, counts):
+            node.overlapCount = count
+        return indptr, indices
@@ -7,9 +7,16 @@ Author: G.J.J. van den Burg
 License: Apache-2.0
 """
 
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
 from . import distributor
 from . import metrics
 from . import removeOverlap
+from . import vpsc
+from .node import NodeArray
+from .node import cachePaths
 
 DEFAULT_OPTIONS = {
     "nodeSpacing": 3,
@@ -18,6 +25,15 @@ DEFAULT_OPTIONS = {
     "algorithm": "overlap",
     "density": 0.85,
     "stubWidth": 1,
+    "maxLayers": None,
+    "weakLinks": False,
+    "stats": False,
+    "tolerance": None,
+    "maxIterations": None,
+    "timeBudget": None,
+    "workers": None,
+    "executor": None,
+    "parallelMinSize": 2000,
 }
 
 
@@ -28,6 +44,10 @@ class Force(object):
         self.distributor = distributor.Distributor()
         self._nodes = []
         self.layers = None
+        self.stats = None
+        self.converged = None
+        self._pool = None
+        self._poolWorkers = None
         self.set_options(options)
 
     def set_options(self, x=None):
@@ -63,20 +83,91 @@ class Force(object):
         return self.layers
 
     def compute(self):
+        self.stats = None
         simOptions = {
             k: v
             for k, v in self.options.items()
             if k in removeOverlap.DEFAULT_OPTIONS
         }
 
-        for node in self._nodes:
-            node.removeStub()
+        if isinstance(self._nodes, NodeArray):
+            self._nodes.removeStubs()
+        else:
+            for node in self._nodes:
+                node.removeStub()
 
+        # The time budget is for the whole computation, so every layer gets
+        # what is left of it. We need the solver statistics to know whether
+        # a limit stopped a solve early.
+        collect = self.options["stats"]
+        budget = self.options["timeBudget"]
+        maxIterations = self.options["maxIterations"]
+        limited = not (budget is None and maxIterations is None)
+        t0 = time.perf_counter()
         layers = self.distributor.distribute(self._nodes)
+        if collect:
+            self.stats = {
+                "distribute": time.perf_counter() - t0,
+                "layers": [],
+            }
+        self.converged = True
+
+        if simOptions["executor"] is None and self.options["workers"]:
+            simOptions["executor"] = self.getPool()
         for layerIndex, nodes in enumerate(layers):
             for node in nodes:
                 node.layerIndex = layerIndex
-            removeOverlap.removeOverlap(nodes, simOptions)
+            if not budget is None:
+                elapsed = time.perf_counter() - t0
+                simOptions["timeBudget"] = max(budget - elapsed, 0)
+            stats = vpsc.SolverStats() if collect or limited else None
+            removeOverlap.removeOverlap(nodes, simOptions, stats=stats)
+            if limited and stats.earlyStops:
+                self.converged = False
+            if collect:
+                self.stats["layers"].append(stats)
+
+        # The renderer and the metrics follow the stub chains of every node
+        if not isinstance(self._nodes, NodeArray):
+            cachePaths(self._nodes)
+
+    def getPool(self):
+        """Return the process pool of the ``workers`` option. It is created
+        on first use and kept for later calls to :meth:`compute`, until
+        :meth:`close` is called."""
+        workers = self.options["workers"]
+        if self._poolWorkers != workers:
+            self.close()
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=workers)
+            self._poolWorkers = workers
+        return self._pool
+
+    def close(self):
+        """Shut down the process pool of the ``workers`` option, if any"""
+        if not self._pool is None:
+            self._pool.shutdown()
+            self._pool = None
+            self._poolWorkers = None
+
+    def getStats(self):
+        """Return the statistics of the last call to :meth:`compute` as a
+        dictionary, or None if the ``stats`` option was not set.
+
+        The dictionary has the time spent distributing the nodes over the
+        layers, the solver statistics of every layer and their total.
+        """
+        if self.stats is None:
+            return None
+        layers = self.stats["layers"]
+        total = vpsc.SolverStats()
+        for stats in layers:
+            total.add(stats)
+        return {
+            "distribute": self.stats["distribute"],
+            "layers": [stats.toDict() for stats in layers],
+            "total": total.toDict(),
+        }
 
     def metrics(self):
         methods = [m for m in dir(metrics) if not m.startswith("_")]
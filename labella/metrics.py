@@ -7,8 +7,13 @@ Author: G.J.J. van den Burg
 License: Apache-2.0
 """
 
+from .node import NodeArray
+from .node import pathLengths
+
 
 def toLayers(nodes):
+    if isinstance(nodes, NodeArray):
+        return nodes.layers()
     if not nodes:
         return None
     if isinstance(nodes[0], list):
@@ -41,8 +46,8 @@ def pathLength(nodes):
     layers = toLayers(nodes)
     thesum = 0
     for layer in layers:
-        for node in layer:
-            thesum += 0 if node.isStub() else abs(node.getPathToRootLength())
+        for length in pathLengths([x for x in layer if not x.isStub()]):
+            thesum += abs(length)
     return thesum / denominatorWithoutStubs(layers)
 
 
@@ -86,18 +91,44 @@ def overDensitySpace(nodes, density=None, layerWidth=None, nodeSpacing=0):
     return total
 
 
+def _sweep(layer, buf):
+    """Sort the nodes of a layer on their left side and return the sorted
+    sides, the original indices, and for every node the end of the run of
+    nodes after it that it overlaps with, as in :meth:`Node.overlapWithNode`.
+    Nodes that can not overlap any node are left out."""
+    sides = []
+    for i, node in enumerate(layer):
+        left, right = node.currentLeft(), node.currentRight()
+        # the distance to any node is at least left - right
+        if left - right < buf:
+            sides.append((left, right, i))
+    sides.sort()
+    lefts = [s[0] for s in sides]
+    ends = []
+    m = len(sides)
+    for i, (_, right, _) in enumerate(sides):
+        # the following nodes overlap while their left side is close
+        # enough to the right side of this node
+        lo, hi = i + 1, m
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if lefts[mid] - right < buf:
+                lo = mid + 1
+            else:
+                hi = mid
+        ends.append(lo)
+    return sides, ends
+
+
 def overlapCount(nodes, buf=0):
     if not nodes:
         return 0
+    _buffer = buf if buf else 0
     layers = toLayers(nodes)
     total = 0
     for layer in layers:
-        count = 0
-        for i in range(len(layer)):
-            for j in range(i + 1, len(layer)):
-                if layer[i].overlapWithNode(layer[j], buf):
-                    count += 1
-        total += count
+        _, ends = _sweep(layer, _buffer)
+        total += sum(end - i - 1 for i, end in enumerate(ends))
     return total
 
 
@@ -107,11 +138,19 @@ def overlapSpace(nodes):
     layers = toLayers(nodes)
     total = 0
     for layer in layers:
+        sides, ends = _sweep(layer, 0)
+        pairs = []
+        for i, end in enumerate(ends):
+            left, right, a = sides[i]
+            for other, otherRight, b in sides[i + 1 : end]:
+                distance = max(left, other) - min(right, otherRight)
+                pairs.append((min(a, b), max(a, b), abs(distance)))
+        # add the overlaps in the order of the layer, so that the sum is the
+        # same as when comparing all pairs
+        pairs.sort()
         count = 0
-        for i in range(len(layer)):
-            for j in range(i + 1, len(layer)):
-                distance = layer[i].distanceFrom(layer[j])
-                count += abs(distance) if distance < 0 else 0
+        for _, _, overlap in pairs:
+            count += overlap
         total += count
     return total / denominator(layers)
 
@@ -7,26 +7,16 @@ Author: G.J.J. van den Burg
 License: Apache-2.0
 """
 
+import weakref
 
-class Node(object):
-    def __init__(self, idealPos, width, data=None):
-        self.idealPos = idealPos
-        self.currentPos = idealPos
-        self.width = width
-        self.data = data
-        self.layerIndex = 0
-        self.parent = None
-        self.overlap = None
-        self.overlapCount = 0
-        self.child = None
-        # for rendering
-        self.x = None
-        self.dx = None
-        self.y = None
-        self.dy = None
-        # other
-        self.w = 0
-        self.h = 0
+from array import array
+
+
+class _BaseNode(object):
+    """Methods shared by :class:`Node`, :class:`Stub` and :class:`NodeView`,
+    which differ in how they store their fields."""
+
+    __slots__ = ()
 
     def __repr__(self):
         s = (
@@ -96,19 +86,37 @@ class Node(object):
         if self.parent:
             self.parent.child = None
             self.parent = None
+            self.clearPaths()
         return self
 
-    def createStub(self, width=None):
-        stub = Node(self.idealPos, width, self.data)
-        stub.currentPos = self.currentPos
-        stub.child = self
+    def createStub(self, width=None, weak=False):
+        stub = Stub(self, width, weak=weak)
         self.parent = stub
+        self.clearPaths()
         return stub
 
     def isStub(self):
         return not (not (self.child))
 
+    def cachePath(self):
+        """Store the path to the root, so that the path methods do not walk
+        the stub chain. The cache is cleared when a stub is created or
+        removed in the chain, but not when the parent is set directly."""
+        # Only the ancestors are stored, so that the cache does not create
+        # a reference cycle through the node itself.
+        self._path = None
+        self._path = tuple(self.getPathToRoot()[1:])
+
+    def clearPaths(self):
+        """Clear the cached path of this node and the nodes below it"""
+        current = self
+        while current:
+            current._path = None
+            current = current.child
+
     def getPathToRoot(self):
+        if not self._path is None:
+            return [self, *self._path]
         path = []
         current = self
         while current:
@@ -117,6 +125,8 @@ class Node(object):
         return path
 
     def getPathFromRoot(self):
+        if not self._path is None:
+            return [*reversed(self._path), self]
         return list(reversed(self.getPathToRoot()))
 
     def getPathToRootLength(self):
@@ -133,6 +143,8 @@ class Node(object):
         return length
 
     def getRoot(self):
+        if not self._path is None:
+            return self._path[-1] if self._path else self
         previous = self
         current = self
         while current:
@@ -148,3 +160,361 @@ class Node(object):
         node.currentPos = self.currentPos
         node.layerIndex = self.layerIndex
         return node
+
+
+class Node(_BaseNode):
+    __slots__ = (
+        "idealPos",
+        "currentPos",
+        "targetPos",
+        "width",
+        "data",
+        "layerIndex",
+        "parent",
+        "overlap",
+        "overlapCount",
+        "child",
+        "x",
+        "dx",
+        "y",
+        "dy",
+        "w",
+        "h",
+        "_path",
+        "__weakref__",
+    )
+
+    def __init__(self, idealPos, width, data=None):
+        self.idealPos = idealPos
+        self.currentPos = idealPos
+        self.width = width
+        self.data = data
+        self.layerIndex = 0
+        self.parent = None
+        self.overlap = None
+        self.overlapCount = 0
+        self.child = None
+        # for rendering
+        self.x = None
+        self.dx = None
+        self.y = None
+        self.dy = None
+        # other
+        self.w = 0
+        self.h = 0
+        self._path = None
+
+
+class Stub(_BaseNode):
+    """Placeholder for a node in a layer above the layer of the node.
+
+    Stubs only store what the distributor, the overlap removal and the
+    renderer need, in slots. The other fields of a :class:`Node` are class
+    attributes with the default values, so a stub only grows a dict when
+    one of them is set.
+
+    With ``weak=True`` the stub refers to its child by a weak reference.
+    The child still refers to the stub as its parent, so the paths to the
+    root work as before, but a layout has no reference cycles and is freed
+    as soon as it is no longer used.
+    """
+
+    __slots__ = (
+        "idealPos",
+        "currentPos",
+        "targetPos",
+        "width",
+        "data",
+        "layerIndex",
+        "parent",
+        "weak",
+        "_child",
+        "_path",
+        "__dict__",
+        "__weakref__",
+    )
+
+    overlap = None
+    overlapCount = 0
+    x = None
+    dx = None
+    y = None
+    dy = None
+    w = 0
+    h = 0
+
+    def __init__(self, child, width=None, weak=False):
+        self.idealPos = child.idealPos
+        self.currentPos = child.currentPos
+        self.width = width
+        self.data = child.data
+        self.layerIndex = 0
+        self.parent = None
+        self.weak = weak
+        self.child = child
+        self._path = None
+
+    @property
+    def child(self):
+        if self.weak and not self._child is None:
+            return self._child()
+        return self._child
+
+    @child.setter
+    def child(self, node):
+        if self.weak and not node is None:
+            node = weakref.ref(node)
+        self._child = node
+
+    def __getstate__(self):
+        # weak references can not be pickled, so the child is stored
+        state = dict(getattr(self, "__dict__", {}))
+        for name in Stub.__slots__:
+            if not name.startswith("_") and hasattr(self, name):
+                state[name] = getattr(self, name)
+        state["child"] = self.child
+        return state
+
+    def __setstate__(self, state):
+        self._path = None
+        self.weak = state.pop("weak")
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+def cachePaths(nodes):
+    """Cache the path to the root of every node, see :meth:`Node.cachePath`.
+    This is done by :meth:`Force.compute <labella.force.Force.compute>`
+    when the layout is done."""
+    for node in nodes:
+        node.cachePath()
+
+
+def pathLengths(nodes):
+    """Return the length of the path to the root of every node, as given by
+    :meth:`Node.getPathToRootLength` up to rounding. The length of a stub is
+    shared by the nodes below it, so every chain is walked once."""
+    lengths = {}
+    out = []
+    for node in nodes:
+        chain = []
+        current = node
+        while current and not current in lengths:
+            chain.append(current)
+            current = current.parent
+        length = lengths[current] if current else 0
+        for current in reversed(chain):
+            targetPos = (
+                current.parent.currentPos
+                if current.parent
+                else current.idealPos
+            )
+            length += abs(current.currentPos - targetPos)
+            lengths[current] = length
+        out.append(lengths[node])
+    return out
+
+
+def _floats(values):
+    """Copy the values to an array of doubles. Contiguous buffers of doubles,
+    such as a float64 NumPy array, are copied in one go."""
+    try:
+        view = memoryview(values)
+    except TypeError:
+        return array("d", values)
+    if view.format == "d" and view.ndim == 1 and view.c_contiguous:
+        out = array("d")
+        out.frombytes(view.cast("B"))
+        return out
+    return array("d", view.tolist())
+
+
+def _column(name):
+    def get(self):
+        return getattr(self.array, name)[self.index]
+
+    def set(self, value):
+        getattr(self.array, name)[self.index] = value
+
+    return property(get, set)
+
+
+def _link(name):
+    def get(self):
+        index = getattr(self.array, name)[self.index]
+        return None if index < 0 else NodeView(self.array, index)
+
+    def set(self, node):
+        getattr(self.array, name)[self.index] = (
+            -1 if node is None else node.index
+        )
+
+    return property(get, set)
+
+
+class NodeView(_BaseNode):
+    """A node of a :class:`NodeArray`.
+
+    Views are created on demand and read and write the arrays of the
+    container, so two views of the same node compare equal.
+    """
+
+    __slots__ = ("array", "index")
+
+    def __init__(self, array, index):
+        self.array = array
+        self.index = index
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, NodeView)
+            and other.array is self.array
+            and other.index == self.index
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.array), self.index))
+
+    idealPos = _column("idealPos")
+    currentPos = _column("currentPos")
+    targetPos = _column("targetPos")
+    width = _column("width")
+    data = _column("data")
+    layerIndex = _column("layerIndex")
+    overlapCount = _column("overlapCount")
+    x = _column("x")
+    dx = _column("dx")
+    y = _column("y")
+    dy = _column("dy")
+    parent = _link("parent")
+    child = _link("child")
+
+    # Views are created on demand, so they do not cache their path
+    _path = None
+
+    def cachePath(self):
+        pass
+
+    def clearPaths(self):
+        pass
+
+    def createStub(self, width=None, weak=False):
+        # the links are indices into the container, so they are never cycles
+        return self.array[self.array.createStub(self.index, width)]
+
+
+class NodeArray(object):
+    """Nodes stored as parallel arrays.
+
+    The positions, widths, layer indices, overlap counts and rendering
+    fields of the nodes are kept in :mod:`array` columns, and the links
+    between a node and its stub are the indices of their rows, with -1 for
+    no link. Indexing or iterating gives :class:`NodeView` objects, so the
+    container can be used wherever a list of nodes is expected: the
+    distributor adds the stubs it creates to the container, and the
+    rendering fields are NaN until they are set.
+    """
+
+    FLOATS = (
+        "idealPos",
+        "currentPos",
+        "targetPos",
+        "width",
+        "x",
+        "dx",
+        "y",
+        "dy",
+    )
+    INTS = ("layerIndex", "overlapCount", "parent", "child")
+
+    def __init__(self, idealPos=(), width=(), data=None):
+        self.idealPos = _floats(idealPos)
+        n = len(self.idealPos)
+        self.width = _floats(width)
+        if len(self.width) != n:
+            raise ValueError("Expected %i widths" % n)
+        self.currentPos = array("d", self.idealPos)
+        self.targetPos = array("d", self.idealPos)
+        for name in ("x", "dx", "y", "dy"):
+            setattr(self, name, array("d", [float("nan")]) * n)
+        self.layerIndex = array("l", [0]) * n
+        self.overlapCount = array("l", [0]) * n
+        self.parent = array("l", [-1]) * n
+        self.child = array("l", [-1]) * n
+        self.data = [None] * n if data is None else list(data)
+        if len(self.data) != n:
+            raise ValueError("Expected %i data items" % n)
+
+    @classmethod
+    def from_arrays(cls, ideal_positions, widths, data=None):
+        """Create the nodes from columns of ideal positions, widths and
+        optionally data, given as lists, :mod:`array` arrays or NumPy
+        arrays. The result can be passed to :meth:`Force.nodes
+        <labella.force.Force.nodes>` directly."""
+        return cls(ideal_positions, widths, data=data)
+
+    def __len__(self):
+        return len(self.idealPos)
+
+    def __getitem__(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("NodeArray index out of range")
+        return NodeView(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield NodeView(self, i)
+
+    def append(self, idealPos, width, data=None):
+        """Add a node and return its index"""
+        for name in NodeArray.FLOATS:
+            getattr(self, name).append(float("nan"))
+        for name in NodeArray.INTS:
+            getattr(self, name).append(0)
+        i = len(self) - 1
+        self.idealPos[i] = self.currentPos[i] = idealPos
+        self.targetPos[i] = idealPos
+        self.width[i] = width
+        self.parent[i] = self.child[i] = -1
+        self.data.append(data)
+        return i
+
+    def createStub(self, i, width=None):
+        """Add a stub for node i and return its index"""
+        j = self.append(
+            self.idealPos[i], 0 if width is None else width, self.data[i]
+        )
+        self.currentPos[j] = self.currentPos[i]
+        self.child[j] = i
+        self.parent[i] = j
+        return j
+
+    def removeStubs(self):
+        """Remove the stubs from the container. The remaining nodes keep
+        their order, but their indices change if a stub came before them."""
+        keep = [i for i in range(len(self)) if self.child[i] < 0]
+        for name in NodeArray.FLOATS:
+            column = getattr(self, name)
+            setattr(self, name, array("d", [column[i] for i in keep]))
+        for name in NodeArray.INTS:
+            column = getattr(self, name)
+            setattr(self, name, array("l", [column[i] for i in keep]))
+        self.data = [self.data[i] for i in keep]
+        for i in range(len(keep)):
+            self.parent[i] = self.child[i] = -1
+
+    def layers(self):
+        """Lists of the nodes of every layer, by their layer index"""
+        layers = []
+        for i in range(len(self)):
+            k = self.layerIndex[i]
+            while len(layers) <= k:
+                layers.append([])
+            layers[k].append(NodeView(self, i))
+        return layers
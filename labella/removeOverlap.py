@@ -7,76 +7,298 @@ Author: G.J.J. van den Burg
 License: Apache-2.0
 """
 
+import time
+
 from . import vpsc
+from .node import NodeArray
 
 DEFAULT_OPTIONS = {
     "lineSpacing": 2,
     "nodeSpacing": 3,
     "minPos": 0,
     "maxPos": None,
+    "solver": "chain",
+    "tolerance": None,
+    "maxIterations": None,
+    "timeBudget": None,
+    "decompose": True,
+    "executor": None,
+    "parallelMinSize": 2000,
 }
 
+SOLVERS = {"chain": vpsc.ChainSolver, "vpsc": vpsc.Solver}
 
-def last(arr):
-    return arr[-1]
+try:
+    from .vpsc_numpy import ArraySolver
+except ImportError:
+    pass
+else:
+    SOLVERS["numpy"] = ArraySolver.fromVariables
 
 
-def nodeToVariable(node):
-    v = vpsc.Variable(node.targetPos)
-    v.node = node
-    return v
+def mergeOptions(options):
+    new_options = {k: v for k, v in DEFAULT_OPTIONS.items()}
+    if not options is None:
+        new_options.update(options)
+    return new_options
 
 
-def removeOverlap(nodes, options):
-    if len(nodes) == 0:
-        return nodes
+def solveOptions(options):
+    return {
+        "tolerance": options["tolerance"],
+        "max_iterations": options["maxIterations"],
+        "time_budget": options["timeBudget"],
+    }
 
-    if options is None:
-        options = {}
-    new_options = {k: v for k, v in DEFAULT_OPTIONS.items()}
-    new_options.update(options)
-    options = new_options
 
+def nodeGap(n1, n2, options):
+    if n1.isStub() and n2.isStub():
+        return (n1.width + n2.width) / 2 + options["lineSpacing"]
+    return (n1.width + n2.width) / 2 + options["nodeSpacing"]
+
+
+def setTargetPositions(nodes):
     for node in nodes:
         node.targetPos = (
             node.parent.currentPos if node.parent else node.idealPos
         )
-
     nodes.sort(key=lambda x: x.targetPos)
 
-    variables = [nodeToVariable(n) for n in nodes]
 
-    constraints = []
-    for i in range(1, len(variables)):
-        v1 = variables[i - 1]
-        v2 = variables[i]
+def chainProblem(nodes, options):
+    """Return the desired positions, the weights and the gaps of the chain
+    of separation constraints for a sorted list of nodes, including the
+    walls at minPos and maxPos, and the index of the first node in the
+    chain."""
+    desired = [node.targetPos for node in nodes]
+    weights = [1] * len(nodes)
+    gaps = [
+        nodeGap(nodes[i - 1], nodes[i], options) for i in range(1, len(nodes))
+    ]
+    first = 0
+    if not options["minPos"] is None:
+        desired.insert(0, options["minPos"])
+        weights.insert(0, 1e10)
+        gaps.insert(0, nodes[0].width / 2)
+        first = 1
+    if not options["maxPos"] is None:
+        desired.append(options["maxPos"])
+        weights.append(1e10)
+        gaps.append(nodes[-1].width / 2)
+    return desired, weights, gaps, first
+
+
+def isFeasible(nodes, options):
+    """Check whether the sorted nodes satisfy all separation constraints
+    and the walls at their target positions."""
+    minPos = options["minPos"]
+    maxPos = options["maxPos"]
+    if not minPos is None:
+        if nodes[0].targetPos - minPos < nodes[0].width / 2:
+            return False
+    if not maxPos is None:
+        if maxPos - nodes[-1].targetPos < nodes[-1].width / 2:
+            return False
+    for i in range(1, len(nodes)):
+        gap = nodeGap(nodes[i - 1], nodes[i], options)
+        if nodes[i].targetPos - nodes[i - 1].targetPos < gap:
+            return False
+    return True
+
+
+def findClusters(desired, gaps):
+    """Return the index of the first variable of every part of the chain
+    that can be solved on its own."""
+    n = len(desired)
+    t = [0] * n
+    offset = 0
+    for i in range(n):
+        if i > 0:
+            offset += gaps[i - 1]
+        t[i] = desired[i] - offset
+    suffixMin = t[:]
+    for i in range(n - 2, -1, -1):
+        suffixMin[i] = min(t[i], suffixMin[i + 1])
+
+    # In terms of t the solution is non-decreasing, so the chain can be cut
+    # where every t before the cut is at most every t after it.
+    starts = [0]
+    prefixMax = t[0]
+    for i in range(1, n):
+        if prefixMax <= suffixMin[i]:
+            starts.append(i)
+        prefixMax = max(prefixMax, t[i])
+    return starts
+
+
+def solveCluster(desired, weights, gaps, solver, limits, stats=None):
+    variables = [vpsc.Variable(d, w) for d, w in zip(desired, weights)]
+    constraints = [
+        vpsc.Constraint(variables[k - 1], variables[k], gaps[k - 1])
+        for k in range(1, len(variables))
+    ]
+    solver = SOLVERS[solver](variables, constraints, stats=stats)
+    solver.solve(**limits)
+    return [v.position() for v in variables]
+
+
+def solveClusterWorker(desired, weights, gaps, solver, limits, collect):
+    """Solve a cluster in a worker process. Only the flat lists are sent
+    to the worker, and the positions and statistics are sent back."""
+    stats = vpsc.SolverStats() if collect else None
+    return solveCluster(desired, weights, gaps, solver, limits, stats), stats
 
-        if v1.node.isStub() and v2.node.isStub():
-            gap = (v1.node.width + v2.node.width) / 2 + options["lineSpacing"]
-        else:
-            gap = (v1.node.width + v2.node.width) / 2 + options["nodeSpacing"]
 
-        constraints.append(vpsc.Constraint(v1, v2, gap))
+def removeOverlap(nodes, options, stats=None):
+    """Move the nodes of a layer, given as a list or a
+    :class:`~labella.node.NodeArray`, apart so that they no longer overlap
+    and return them sorted by target position. With ``decompose``
+    independent clusters are solved separately, those of at least
+    ``parallelMinSize`` nodes in the ``executor`` if one is set, and the
+    solver statistics are added to ``stats`` if it is given."""
+    if isinstance(nodes, NodeArray):
+        nodes = list(nodes)
+    if len(nodes) == 0:
+        return nodes
+
+    options = mergeOptions(options)
+    if not options["solver"] in SOLVERS:
+        raise ValueError(options["solver"])
+    t0 = time.perf_counter()
 
-    if ("minPos" in options) and (not options["minPos"] is None):
-        leftWall = vpsc.Variable(options["minPos"], 1e10)
-        v = variables[0]
-        constraints.append(vpsc.Constraint(leftWall, v, v.node.width / 2))
-        variables = [leftWall] + variables
+    setTargetPositions(nodes)
+
+    # If nothing overlaps at the target positions, there is nothing to solve
+    if isFeasible(nodes, options):
+        for node in nodes:
+            node.currentPos = round(node.targetPos)
+        if not stats is None:
+            stats.feasible += 1
+            stats.addTime("setup", time.perf_counter() - t0)
+        return nodes
 
-    if ("maxPos" in options) and (not options["maxPos"] is None):
-        rightWall = vpsc.Variable(options["maxPos"], 1e10)
-        lastv = last(variables)
-        constraints.append(
-            vpsc.Constraint(lastv, rightWall, lastv.node.width / 2)
+    desired, weights, gaps, first = chainProblem(nodes, options)
+    n = len(desired)
+    if options["decompose"]:
+        starts = findClusters(desired, gaps)
+    else:
+        starts = [0]
+
+    t1 = time.perf_counter()
+    if not stats is None:
+        stats.addTime("setup", t1 - t0)
+
+    budget = options["timeBudget"]
+    executor = options["executor"]
+    positions = desired[:]
+    futures = []
+    for start, end in zip(starts, starts[1:] + [n]):
+        if end - start == 1:
+            continue
+        if not budget is None:
+            elapsed = time.perf_counter() - t1
+            options["timeBudget"] = max(budget - elapsed, 0)
+        args = (
+            desired[start:end],
+            weights[start:end],
+            gaps[start : end - 1],
+            options["solver"],
+            solveOptions(options),
         )
-        variables.append(rightWall)
+        parallel = end - start >= options["parallelMinSize"]
+        if not executor is None and parallel:
+            future = executor.submit(
+                solveClusterWorker, *args, not stats is None
+            )
+            futures.append((start, end, future))
+        else:
+            positions[start:end] = solveCluster(*args, stats=stats)
+        if not stats is None:
+            stats.clusters += 1
+
+    for start, end, future in futures:
+        positions[start:end], clusterStats = future.result()
+        if not stats is None:
+            stats.add(clusterStats)
 
-    solver = vpsc.Solver(variables, constraints)
-    solver.solve()
+    t2 = time.perf_counter()
+    if not stats is None:
+        stats.addTime("solve", t2 - t1)
 
-    variables = [v for v in variables if v.node]
-    for v in variables:
-        v.node.currentPos = round(v.position())
+    for i, node in enumerate(nodes):
+        node.currentPos = round(positions[first + i])
+    if not stats is None:
+        stats.addTime("update", time.perf_counter() - t2)
 
     return nodes
+
+
+def removeOverlapBatch(nodeLists, options=None, timings=None):
+    """Remove the overlap in many independent lists of nodes with a single
+    solve, with the same result as :func:`removeOverlap` on every list. If
+    ``timings`` is a dict, it is updated with the number of problems and
+    nodes and the time spent per phase."""
+    options = mergeOptions(options)
+    if not options["solver"] in SOLVERS:
+        raise ValueError(options["solver"])
+
+    t0 = time.perf_counter()
+    if options["solver"] == "vpsc":
+        nodeLists = [removeOverlap(nodes, options) for nodes in nodeLists]
+        if not timings is None:
+            timings.update(
+                problems=len(nodeLists),
+                nodes=sum(len(nodes) for nodes in nodeLists),
+                setup=0,
+                solve=time.perf_counter() - t0,
+                update=0,
+            )
+        return nodeLists
+
+    desired = []
+    weights = []
+    gaps = []
+    breaks = []
+    firsts = []
+    for nodes in nodeLists:
+        if len(nodes) == 0:
+            firsts.append(None)
+            continue
+        setTargetPositions(nodes)
+        pDesired, pWeights, pGaps, first = chainProblem(nodes, options)
+        if desired:
+            gaps.append(0)
+            breaks.append(True)
+        firsts.append(len(desired) + first)
+        desired.extend(pDesired)
+        weights.extend(pWeights)
+        gaps.extend(pGaps)
+        breaks.extend([False] * len(pGaps))
+
+    t1 = time.perf_counter()
+    if options["solver"] == "numpy":
+        solver = ArraySolver(desired, gaps, weights=weights, breaks=breaks)
+        solver.solve(**solveOptions(options))
+        positions = solver.positions().tolist()
+    else:
+        positions = vpsc.solveChains(
+            desired, gaps, weights=weights, breaks=breaks
+        )
+
+    t2 = time.perf_counter()
+    for nodes, first in zip(nodeLists, firsts):
+        if first is None:
+            continue
+        for i, node in enumerate(nodes):
+            node.currentPos = round(positions[first + i])
+    t3 = time.perf_counter()
+
+    if not timings is None:
+        timings.update(
+            problems=len(nodeLists),
+            nodes=sum(len(nodes) for nodes in nodeLists),
+            setup=t1 - t0,
+            solve=t2 - t1,
+            update=t3 - t2,
+        )
+    return nodeLists
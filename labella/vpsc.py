@@ -12,10 +12,73 @@ Author: G.J.J. van den Burg
 License: Apache-2.0
 """
 
+import heapq
+import time
+
 from sys import maxsize
 
 
+class SolverStats(object):
+    """Counters and timings collected by the solvers.
+
+    Pass an instance as the ``stats`` argument of a solver to collect them.
+    Without it, the solvers only pay for a check against None. Statistics of
+    several solves can be combined with :meth:`add`, and :meth:`toDict`
+    gives a plain dictionary for logging or metrics. Like the counters, the
+    ``cost`` is summed over the solves that use the same instance.
+    """
+
+    COUNTERS = (
+        "satisfyRounds",
+        "merges",
+        "splits",
+        "unsatisfiable",
+        "mostViolatedCalls",
+        "earlyStops",
+        "clusters",
+        "feasible",
+    )
+
+    def __init__(self):
+        self.satisfyRounds = 0
+        self.merges = 0
+        self.splits = 0
+        self.unsatisfiable = 0
+        self.mostViolatedCalls = 0
+        self.earlyStops = 0
+        self.clusters = 0
+        self.feasible = 0
+        self.maxBlockSize = 0
+        self.cost = 0
+        self.times = {}
+
+    def __repr__(self):
+        return "SolverStats(%r)" % self.toDict()
+
+    def addTime(self, phase, seconds):
+        self.times[phase] = self.times.get(phase, 0) + seconds
+
+    def add(self, other):
+        for name in SolverStats.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.maxBlockSize = max(self.maxBlockSize, other.maxBlockSize)
+        self.cost += other.cost
+        for phase, seconds in other.times.items():
+            self.addTime(phase, seconds)
+        return self
+
+    def toDict(self):
+        out = {name: getattr(self, name) for name in SolverStats.COUNTERS}
+        out["maxBlockSize"] = self.maxBlockSize
+        out["cost"] = self.cost
+        out["times"] = dict(self.times)
+        return out
+
+
 class PositionStats(object):
+
+    __slots__ = ("scale", "AB", "AD", "A2")
+
     def __init__(self, scale):
         self.scale = scale
         self.AB = 0
@@ -33,8 +96,26 @@ class PositionStats(object):
     def getPosn(self):
         return (self.AD - self.AB) / self.A2
 
+    def costChange(self, p0, p1):
+        # The cost of the variables as a function of the block position p
+        # is A2 * (p - getPosn())^2 plus a constant, so moving the block
+        # from p0 to p1 changes it by the difference of the squares.
+        p = self.getPosn()
+        return self.A2 * ((p1 - p) * (p1 - p) - (p0 - p) * (p0 - p))
+
 
 class Constraint(object):
+
+    __slots__ = (
+        "left",
+        "right",
+        "gap",
+        "equality",
+        "active",
+        "unsatisfiable",
+        "lm",
+    )
+
     def __init__(self, left, right, gap, equality=None):
         if equality is None:
             equality = False
@@ -44,6 +125,7 @@ class Constraint(object):
         self.equality = equality
         self.active = False
         self.unsatisfiable = False
+        self.lm = 0
 
     def slack(self):
         if self.unsatisfiable:
@@ -68,6 +150,18 @@ class Constraint(object):
 
 
 class Variable(object):
+
+    __slots__ = (
+        "desiredPosition",
+        "weight",
+        "scale",
+        "offset",
+        "node",
+        "block",
+        "cIn",
+        "cOut",
+    )
+
     def __init__(self, desiredPosition, weight=None, scale=None):
         if weight is None:
             weight = 1
@@ -78,6 +172,10 @@ class Variable(object):
         self.scale = scale
         self.offset = 0
         self.node = None
+        self.block = None
+        # The constraint lists are filled in by the Solver
+        self.cIn = None
+        self.cOut = None
 
     def dfdv(self):
         return 2.0 * self.weight * (self.position() - self.desiredPosition)
@@ -87,14 +185,17 @@ class Variable(object):
             self.block.ps.scale * self.block.posn + self.offset
         ) / self.scale
 
-    def visitNeighbours(self, prev, f):
-        def ff(c, _next):
-            return c.active and prev != _next and f(c, _next)
-
+    def activeNeighbours(self, prev):
         for c in self.cOut:
-            ff(c, c.right)
+            if c.active and prev != c.right:
+                yield c, c.right
         for c in self.cIn:
-            ff(c, c.left)
+            if c.active and prev != c.left:
+                yield c, c.left
+
+    def visitNeighbours(self, prev, f):
+        for c, _next in self.activeNeighbours(prev):
+            f(c, _next)
 
     def __repr__(self):
         s = "Variable(desiredPos=%r, weight=%r, scale=%r, offset=%r)" % (
@@ -110,10 +211,15 @@ class Variable(object):
 
 
 class Block(object):
+
+    __slots__ = ("vars", "ps", "posn", "blockInd", "_cost")
+
     def __init__(self, v):
         self.vars = []
         v.offset = 0
         self.ps = PositionStats(v.scale)
+        self.blockInd = -1
+        self._cost = None
         self.addVariable(v)
 
     def addVariable(self, v):
@@ -121,46 +227,61 @@ class Block(object):
         self.vars.append(v)
         self.ps.addVariable(v)
         self.posn = self.ps.getPosn()
+        self._cost = None
 
     def updateWeightedPosition(self):
+        posn = self.posn
         self.ps.AB = 0
         self.ps.AD = 0
         self.ps.A2 = 0
         for i in range(len(self.vars)):
             self.ps.addVariable(self.vars[i])
         self.posn = self.ps.getPosn()
+        if not self._cost is None:
+            self._cost += self.ps.costChange(posn, self.posn)
 
     def compute_lm(self, v, u, postAction):
-        dfdv = v.dfdv()
-        _self = self
-
-        def f(c, _next):
-            nonlocal dfdv
-            _dfdv = _self.compute_lm(_next, v, postAction)
-            if _next == c.right:
-                dfdv += _dfdv * c.left.scale
-                c.lm = _dfdv
+        # Post-order walk over the active constraint tree using an explicit
+        # stack, so that large blocks do not hit the recursion limit. Each
+        # frame holds the variable, the constraint we reached it through,
+        # its remaining neighbours and its accumulated derivative.
+        stack = [(v, None, v.activeNeighbours(u), [v.dfdv()])]
+        while True:
+            var, c, neighbours, dfdv = stack[-1]
+            for _c, _next in neighbours:
+                stack.append(
+                    (_next, _c, _next.activeNeighbours(var), [_next.dfdv()])
+                )
+                break
             else:
-                dfdv += _dfdv * c.right.scale
-                c.lm = -_dfdv
-            postAction(c)
-
-        v.visitNeighbours(u, f)
-        return dfdv / v.scale
+                stack.pop()
+                _dfdv = dfdv[0] / var.scale
+                if not stack:
+                    return _dfdv
+                parent_dfdv = stack[-1][3]
+                if var == c.right:
+                    parent_dfdv[0] += _dfdv * c.left.scale
+                    c.lm = _dfdv
+                else:
+                    parent_dfdv[0] += _dfdv * c.right.scale
+                    c.lm = -_dfdv
+                postAction(c)
 
     def populateSplitBlock(self, v, prev):
-        _self = self
-
-        def f(c, _next):
-            _next.offset = v.offset
-            if _next == c.right:
-                _next.offset += c.gap
+        stack = [(v, v.activeNeighbours(prev))]
+        while stack:
+            var, neighbours = stack[-1]
+            for c, _next in neighbours:
+                _next.offset = var.offset
+                if _next == c.right:
+                    _next.offset += c.gap
+                else:
+                    _next.offset -= c.gap
+                self.addVariable(_next)
+                stack.append((_next, _next.activeNeighbours(var)))
+                break
             else:
-                _next.offset -= c.gap
-            _self.addVariable(_next)
-            _self.populateSplitBlock(_next, v)
-
-        v.visitNeighbours(prev, f)
+                stack.pop()
 
     def traverse(self, visit, acc, v, prev):
         _self = self
@@ -206,27 +327,38 @@ class Block(object):
         return m
 
     def findPath(self, v, prev, to, visit):
-        _self = self
-        endFound = False
-
-        def f(c, _next):
-            nonlocal endFound
-            if not endFound and (
-                _next == to or _self.findPath(_next, v, to, visit)
-            ):
-                endFound = True
-                visit(c, _next)
-
-        v.visitNeighbours(prev, f)
-        return endFound
+        # Depth-first search for the path from v to the variable 'to'. The
+        # constraints on the path are visited starting from the end, as the
+        # recursive version did when unwinding.
+        stack = [(v, v.activeNeighbours(prev))]
+        path = []
+        while stack:
+            var, neighbours = stack[-1]
+            for c, _next in neighbours:
+                path.append((c, _next))
+                if _next == to:
+                    for c, _next in reversed(path):
+                        visit(c, _next)
+                    return True
+                stack.append((_next, _next.activeNeighbours(var)))
+                break
+            else:
+                stack.pop()
+                if stack:
+                    path.pop()
+        return False
 
     def isActiveDirectedPathBetween(self, u, v):
-        if u == v:
-            return True
-        for i in range(len(u.cOut) - 1, -1, -1):
-            c = u.cOut[i]
-            if c.active and self.isActiveDirectedPathBetween(c.right, v):
+        stack = [u]
+        seen = set()
+        while stack:
+            w = stack.pop()
+            if w == v:
                 return True
+            for c in w.cOut:
+                if c.active and not c.right in seen:
+                    seen.add(c.right)
+                    stack.append(c.right)
         return False
 
     @classmethod
@@ -252,23 +384,46 @@ class Block(object):
 
     def mergeAcross(self, b, c, dist):
         c.active = True
+        # Update the cost incrementally: move our own variables to the new
+        # block position and add the cost of the variables of b.
+        cost, posn = self._cost, self.posn
+        if not cost is None:
+            ps = PositionStats(self.ps.scale)
+            ps.AB, ps.AD, ps.A2 = self.ps.AB, self.ps.AD, self.ps.A2
         for i in range(len(b.vars)):
             v = b.vars[i]
             v.offset += dist
             self.addVariable(v)
         self.posn = self.ps.getPosn()
+        if not cost is None:
+            self._cost = (
+                cost + ps.costChange(posn, self.posn) + Block.varsCost(b.vars)
+            )
 
-    def cost(self):
+    @classmethod
+    def varsCost(cls, vs):
         _sum = 0
-        for i in range(len(self.vars) - 1, -1, -1):
-            v = self.vars[i]
+        for i in range(len(vs) - 1, -1, -1):
+            v = vs[i]
             d = v.position() - v.desiredPosition
             _sum += d * d * v.weight
         return _sum
 
+    def cost(self, recompute=False):
+        if recompute or self._cost is None:
+            self._cost = Block.varsCost(self.vars)
+        return self._cost
+
 
 class Blocks(object):
-    def __init__(self, vs):
+    """Container of the blocks of a solver.
+
+    Every block stores its index in the container in ``blockInd``, so
+    blocks are removed in constant time by moving the last block into the
+    free slot. Removed blocks get ``blockInd = -1``.
+    """
+
+    def __init__(self, vs, stats=None):
         self.vs = vs
         n = len(vs)
         self._list = [None] * n
@@ -276,46 +431,108 @@ class Blocks(object):
             b = Block(vs[i])
             self._list[i] = b
             b.blockInd = i
-
-    def cost(self):
-        _sum = 0
-        for i in range(len(self._list) - 1, -1, -1):
-            _sum += self._list[i].cost()
-        return _sum
+        self._cost = None
+        self._inserted = None
+        self.stats = stats
+        if not stats is None and n:
+            stats.maxBlockSize = max(stats.maxBlockSize, 1)
+
+    def __len__(self):
+        return len(self._list)
+
+    def __iter__(self):
+        # Iterate over the blocks present when iteration starts and then
+        # over the blocks inserted since, skipping those that have been
+        # removed. This makes it safe to insert and remove blocks while
+        # iterating.
+        outer = self._inserted
+        self._inserted = inserted = []
+        try:
+            for b in self._list[:]:
+                if b.blockInd >= 0:
+                    yield b
+            i = 0
+            while i < len(inserted):
+                b = inserted[i]
+                i += 1
+                if b.blockInd >= 0:
+                    yield b
+        finally:
+            self._inserted = outer
+            if not outer is None:
+                outer.extend(inserted)
+
+    def cost(self, recompute=False):
+        # The total cost is kept up to date by insert, remove, merge and
+        # updateBlockPositions, so only the first call walks the blocks.
+        if recompute or self._cost is None:
+            _sum = 0
+            for i in range(len(self._list) - 1, -1, -1):
+                _sum += self._list[i].cost(recompute=recompute)
+            self._cost = _sum
+        return self._cost
 
     def insert(self, b):
         b.blockInd = len(self._list)
         self._list.append(b)
+        if not self._inserted is None:
+            self._inserted.append(b)
+        if not self._cost is None:
+            self._cost += b.cost()
 
     def remove(self, b):
-        swapBlock = self._list[-1]
-        if not b == swapBlock:
+        swapBlock = self._list.pop()
+        if not b is swapBlock:
             self._list[b.blockInd] = swapBlock
             swapBlock.blockInd = b.blockInd
-        self._list = self._list[:-1]
+        b.blockInd = -1
+        if not self._cost is None:
+            self._cost -= b.cost()
 
     def merge(self, c):
         l = c.left.block
         r = c.right.block
         dist = c.right.offset - c.left.offset - c.gap
         if len(l.vars) < len(r.vars):
-            r.mergeAcross(l, c, dist)
             self.remove(l)
+            self._mergeAcross(r, l, c, dist)
         else:
-            l.mergeAcross(r, c, -dist)
             self.remove(r)
+            self._mergeAcross(l, r, c, -dist)
+        if not self.stats is None:
+            self.stats.merges += 1
+            self.stats.maxBlockSize = max(
+                self.stats.maxBlockSize, len(c.left.block.vars)
+            )
+
+    def _mergeAcross(self, b, other, c, dist):
+        if self._cost is None:
+            b.mergeAcross(other, c, dist)
+            return
+        self._cost -= b.cost()
+        b.mergeAcross(other, c, dist)
+        self._cost += b.cost()
 
     def forEach(self, f):
-        for b in self._list:
+        for b in self:
             f(b)
 
     def updateBlockPositions(self):
         for b in self._list:
+            if self._cost is None:
+                b.updateWeightedPosition()
+                continue
+            self._cost -= b.cost()
             b.updateWeightedPosition()
+            self._cost += b.cost()
 
     def split(self, inactive):
+        """Split every block at its constraint with the most negative
+        Lagrange multiplier, if that is below the tolerance. Returns the
+        number of splits."""
         self.updateBlockPositions()
-        for b in self._list:
+        splits = 0
+        for b in self:
             v = b.findMinLM()
             if not v is None and v.lm < Solver.LAGRANGIAN_TOLERANCE:
                 b = v.left.block
@@ -324,70 +541,177 @@ class Blocks(object):
                     self.insert(nb)
                 self.remove(b)
                 inactive.append(v)
+                splits += 1
+                if not self.stats is None:
+                    self.stats.splits += 1
+        return splits
+
+
+class ConstraintHeap(object):
+    """Lazy min-heap of the inactive constraints, keyed on slack.
+
+    Equality constraints always come first. Slacks change whenever blocks
+    move, so keys in the heap can be stale: a stale entry is re-keyed when
+    it reaches the top. When the top of the heap is not violated, the heap
+    is rebuilt from the current slacks once before we conclude that no
+    constraint is violated.
+    """
+
+    def __init__(self, cs):
+        # Slacks are only available once the blocks exist, so the heap is
+        # built on the first call to mostViolated.
+        self._entries = dict.fromkeys(cs)
+        self._heap = []
+        self._counter = 0
+        self._dirty = True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __contains__(self, c):
+        return c in self._entries
+
+    def _entry(self, c):
+        self._counter += 1
+        entry = [not c.equality, c.slack(), self._counter, c]
+        self._entries[c] = entry
+        return entry
+
+    def append(self, c):
+        if c in self._entries:
+            return
+        if self._dirty:
+            self._entries[c] = None
+        else:
+            heapq.heappush(self._heap, self._entry(c))
+
+    def remove(self, c):
+        entry = self._entries.pop(c)
+        if not entry is None:
+            entry[-1] = None
+
+    def invalidate(self):
+        """Mark all keys as stale, e.g. after the desired positions change.
+        The heap is rebuilt on the next call to mostViolated."""
+        self._dirty = True
+
+    def rebuild(self):
+        self._heap = [self._entry(c) for c in list(self._entries)]
+        heapq.heapify(self._heap)
+        self._dirty = False
+
+    def mostViolated(self):
+        if self._dirty:
+            self.rebuild()
+        heap = self._heap
+        rebuilt = False
+        while True:
+            while heap:
+                entry = heap[0]
+                c = entry[-1]
+                if c is None:
+                    heapq.heappop(heap)
+                elif c.slack() != entry[1]:
+                    entry[-1] = None
+                    heapq.heapreplace(heap, self._entry(c))
+                else:
+                    break
+            if not heap:
+                return None
+            c = heap[0][-1]
+            if c.equality or (
+                heap[0][1] < Solver.ZERO_UPPERBOUND and not c.active
+            ):
+                heapq.heappop(heap)
+                del self._entries[c]
+                return c
+            if rebuilt:
+                return c
+            self.rebuild()
+            heap = self._heap
+            rebuilt = True
 
 
 class Solver(object):
 
     LAGRANGIAN_TOLERANCE = -1e-4
     ZERO_UPPERBOUND = -1e-10
+    TOLERANCE = 0.0001
 
-    def __init__(self, vs, cs):
+    def __init__(self, vs, cs, stats=None):
         self.vs = vs
         self.cs = cs
+        self.stats = stats
         for v in vs:
             v.cIn = []
             v.cOut = []
         for c in cs:
             c.left.cOut.append(c)
             c.right.cIn.append(c)
-        self.inactive = cs[:]
-        for c in self.inactive:
+        for c in cs:
             c.active = False
+        self.inactive = ConstraintHeap(cs)
         self.bs = None
+        self.converged = None
 
-    def cost(self):
-        return self.bs.cost()
+    def cost(self, recompute=False):
+        """Return the cost of the current solution.
+
+        The cost is tracked incrementally while solving, so this is cheap.
+        Pass ``recompute=True`` to compute it from the variable positions.
+        """
+        return self.bs.cost(recompute=recompute)
 
     def setStartingPositions(self, ps):
-        self.inactive = self.cs[:]
-        for c in self.inactive:
+        for c in self.cs:
             c.active = False
-        self.bs = Blocks(self.vs)
+            c.unsatisfiable = False
+        self.inactive = ConstraintHeap(self.cs)
+        self.bs = Blocks(self.vs, stats=self.stats)
         for i, b in enumerate(self.bs):
             b.posn = ps[i]
+        self.bs.cost(recompute=True)
 
     def setDesiredPositions(self, ps):
+        """Set new desired positions for the variables.
+
+        The blocks and the active set of a previous solve are kept, so a
+        following call to :meth:`solve` starts from the previous solution.
+        When the desired positions changed only a little, this is much
+        cheaper than solving from scratch.
+        """
         for i, v in enumerate(self.vs):
             v.desiredPosition = ps[i]
+        if self.bs is None:
+            return
+        # Constraints found to be unsatisfiable may be satisfiable now.
+        for c in self.cs:
+            if c.unsatisfiable:
+                c.unsatisfiable = False
+                self.inactive.append(c)
+        self.inactive.invalidate()
+        self.bs.updateBlockPositions()
+        self.bs.cost(recompute=True)
 
     def mostViolated(self):
-        minSlack = maxsize
-        v = None
-        l = self.inactive
-        n = len(l)
-        deletePoint = n
-        for i in range(n):
-            c = l[i]
-            if c.unsatisfiable:
-                continue
-            slack = c.slack()
-            if c.equality or slack < minSlack:
-                minSlack = slack
-                v = c
-                deletePoint = i
-                if c.equality:
-                    break
-        if deletePoint != n and (
-            minSlack < Solver.ZERO_UPPERBOUND and not v.active or v.equality
-        ):
-            l[deletePoint] = l[n - 1]
-            l = l[:-1]
-        return v
+        if not self.stats is None:
+            self.stats.mostViolatedCalls += 1
+        return self.inactive.mostViolated()
 
     def satisfy(self):
+        stats = self.stats
+        if not stats is None:
+            stats.satisfyRounds += 1
+            t0 = time.perf_counter()
         if self.bs is None:
-            self.bs = Blocks(self.vs)
-        self.bs.split(self.inactive)
+            self.bs = Blocks(self.vs, stats=stats)
+        splits = self.bs.split(self.inactive)
+        if not stats is None:
+            t1 = time.perf_counter()
+            stats.addTime("split", t1 - t0)
         v = self.mostViolated()
         while (v) and (
             v.equality or v.slack() < Solver.ZERO_UPPERBOUND and not v.active
@@ -400,6 +724,8 @@ class Solver(object):
                 if lb.isActiveDirectedPathBetween(v.right, v.left):
                     # Cycle found
                     v.unsatisfiable = True
+                    if not stats is None:
+                        stats.unsatisfiable += 1
                     v = self.mostViolated()
                     continue
                 split = lb.splitBetween(v.left, v.right)
@@ -408,21 +734,246 @@ class Solver(object):
                     self.bs.insert(split["rb"])
                     self.bs.remove(lb)
                     self.inactive.append(split["constraint"])
+                    if not stats is None:
+                        stats.splits += 1
                 else:
                     v.unsatisfiable = True
+                    if not stats is None:
+                        stats.unsatisfiable += 1
                     v = self.mostViolated()
                     continue
                 if v.slack() >= 0:
                     self.inactive.append(v)
                 else:
                     self.bs.merge(v)
-
-    def solve(self):
-        self.satisfy()
+            v = self.mostViolated()
+        if not stats is None:
+            stats.addTime("satisfy", time.perf_counter() - t1)
+        return splits
+
+    def solve(self, tolerance=None, max_iterations=None, time_budget=None):
+        """Solve the problem and return the cost.
+
+        Rounds of splitting and satisfying the constraints are repeated
+        until no block is split and the cost changes by less than
+        ``tolerance``. The number of rounds can be limited with
+        ``max_iterations`` and the time spent with ``time_budget`` (in
+        seconds). The first round always completes, and a round ends with
+        all satisfiable constraints satisfied, so the solver always returns
+        a feasible solution. The ``converged`` attribute is False if a
+        limit stopped the solve.
+        """
+        if tolerance is None:
+            tolerance = Solver.TOLERANCE
+        deadline = None
+        if not time_budget is None:
+            deadline = time.perf_counter() + time_budget
+
+        self.converged = True
+        splits = self.satisfy()
+        rounds = 1
         lastcost = maxsize
         cost = self.bs.cost()
-        while abs(lastcost - cost) > 0.0001:
-            self.satisfy()
+        while splits or abs(lastcost - cost) > tolerance:
+            if (not max_iterations is None and rounds >= max_iterations) or (
+                not deadline is None and time.perf_counter() >= deadline
+            ):
+                self.converged = False
+                break
+            splits = self.satisfy()
+            rounds += 1
             lastcost = cost
             cost = self.bs.cost()
+        if not self.stats is None:
+            self.stats.cost += cost
+            if not self.converged:
+                self.stats.earlyStops += 1
         return cost
+
+
+class ChainSolver(object):
+    """Exact solver for a chain of separation constraints.
+
+    When the constraints link the variables into a single chain (v0 -> v1 ->
+    ... -> vn with inequality constraints), the problem reduces to weighted
+    isotonic regression, which we solve exactly with the pool adjacent
+    violators algorithm in linear time after the chain is ordered. The
+    resulting blocks are regular :class:`Block` objects, so
+    :meth:`Variable.position` works as it does after :meth:`Solver.solve`.
+    """
+
+    def __init__(self, vs, cs, stats=None):
+        chain = ChainSolver.chainOrder(vs, cs)
+        if chain is None:
+            raise ValueError("Constraints do not form a chain")
+        self.vs = vs
+        self.cs = cs
+        self.stats = stats
+        self.order, self.gaps = chain
+        self.blocks = None
+        self.converged = None
+
+    @classmethod
+    def chainOrder(cls, vs, cs):
+        """Return the chain order of the variables and the gaps between
+        consecutive variables, or None if the constraints are not a chain."""
+        if len(cs) != max(len(vs) - 1, 0):
+            return None
+        index = {id(v): i for i, v in enumerate(vs)}
+        nextVar = [None] * len(vs)
+        nextGap = [0] * len(vs)
+        hasPrev = [False] * len(vs)
+        for c in cs:
+            if c.equality:
+                return None
+            i = index.get(id(c.left))
+            j = index.get(id(c.right))
+            if i is None or j is None or i == j:
+                return None
+            if not nextVar[i] is None or hasPrev[j]:
+                return None
+            nextVar[i] = j
+            nextGap[i] = c.gap
+            hasPrev[j] = True
+
+        heads = [i for i in range(len(vs)) if not hasPrev[i]]
+        if len(heads) != 1:
+            return None
+        order = []
+        gaps = []
+        i = heads[0]
+        while not i is None:
+            order.append(vs[i])
+            gaps.append(nextGap[i])
+            i = nextVar[i]
+        if len(order) != len(vs):
+            return None
+        return order, gaps[:-1]
+
+    @classmethod
+    def isChain(cls, vs, cs):
+        return not cls.chainOrder(vs, cs) is None
+
+    def setDesiredPositions(self, ps):
+        for i, v in enumerate(self.vs):
+            v.desiredPosition = ps[i]
+
+    def solve(self, tolerance=None, max_iterations=None, time_budget=None):
+        # The solution is exact, so the limits of Solver.solve are accepted
+        # for compatibility only.
+        order = self.order
+        n = len(order)
+        self.converged = True
+        if n == 0:
+            self.blocks = []
+            return 0
+
+        # Cumulative gaps, so that the constraints become y[i] <= y[i+1]
+        # with y[i] = scale[i] * position[i] - offsets[i].
+        offsets = [0] * n
+        for i in range(1, n):
+            offsets[i] = offsets[i - 1] + self.gaps[i - 1]
+
+        ws = [v.weight / (v.scale * v.scale) for v in order]
+        ts = [
+            v.scale * v.desiredPosition - offsets[i]
+            for i, v in enumerate(order)
+        ]
+        stats = self.stats
+        if not stats is None:
+            t0 = time.perf_counter()
+        starts, _, _ = ChainSolver.pool(ws, ts)
+        if not stats is None:
+            t1 = time.perf_counter()
+            stats.addTime("satisfy", t1 - t0)
+
+        self.blocks = ChainSolver.buildBlocks(order, offsets, starts)
+        cost = self.cost()
+        if not stats is None:
+            stats.addTime("blocks", time.perf_counter() - t1)
+            stats.satisfyRounds += 1
+            stats.merges += n - len(starts)
+            stats.maxBlockSize = max(
+                stats.maxBlockSize, max(len(b.vars) for b in self.blocks)
+            )
+            stats.cost += cost
+        return cost
+
+    @classmethod
+    def pool(cls, ws, ts, breaks=None):
+        """Pool adjacent violators for weights ws and targets ts.
+
+        Returns for every pooled block the index of its first element, the
+        sum of the weights and the weighted sum of the targets. When breaks
+        is given, elements i and i + 1 are never pooled if breaks[i] is
+        true.
+        """
+        # The stack holds the pooled blocks, floor is the number of blocks
+        # on it that are before the last break.
+        starts = []
+        sumW = []
+        sumWT = []
+        floor = 0
+        for i in range(len(ws)):
+            if breaks and i > 0 and breaks[i - 1]:
+                floor = len(starts)
+            w = ws[i]
+            start, W, WT = i, w, w * ts[i]
+            while len(sumW) > floor and sumWT[-1] * W > WT * sumW[-1]:
+                start = starts.pop()
+                W += sumW.pop()
+                WT += sumWT.pop()
+            starts.append(start)
+            sumW.append(W)
+            sumWT.append(WT)
+        return starts, sumW, sumWT
+
+    @classmethod
+    def buildBlocks(cls, order, offsets, starts):
+        """Create the blocks for a solution of the chain, given the
+        cumulative gaps and the index of the first variable of every
+        block."""
+        blocks = []
+        ends = list(starts[1:]) + [len(order)]
+        for start, end in zip(starts, ends):
+            b = Block(order[start])
+            for k in range(start + 1, end):
+                v = order[k]
+                v.offset = offsets[k] - offsets[start]
+                b.addVariable(v)
+            blocks.append(b)
+        return blocks
+
+    def cost(self):
+        return sum(b.cost() for b in self.blocks)
+
+
+def solveChains(desired, gaps, weights=None, scales=None, breaks=None):
+    """Solve one or more chains of separation constraints given as lists.
+
+    This solves the same problem as :class:`ChainSolver` without creating
+    :class:`Variable` and :class:`Constraint` objects. The variables are in
+    chain order and there is one gap between every pair of consecutive
+    variables. Several independent chains can be solved in one call by
+    concatenating them and setting ``breaks[i]`` to True when variable i is
+    the last of its chain. Returns the list of positions.
+    """
+    n = len(desired)
+    if weights is None:
+        weights = [1] * n
+    if scales is None:
+        scales = [1] * n
+    offsets = [0] * n
+    for i in range(1, n):
+        offsets[i] = offsets[i - 1] + gaps[i - 1]
+    ws = [weights[i] / (scales[i] * scales[i]) for i in range(n)]
+    ts = [scales[i] * desired[i] - offsets[i] for i in range(n)]
+    starts, sumW, sumWT = ChainSolver.pool(ws, ts, breaks=breaks)
+
+    positions = [0] * n
+    ends = starts[1:] + [n]
+    for start, end, W, WT in zip(starts, ends, sumW, sumWT):
+        y = WT / W
+        for i in range(start, end):
+            positions[i] = (y + offsets[i]) / scales[i]
+    return positions
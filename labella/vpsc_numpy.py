@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file is part of labella.py.
+
+Array-backed VPSC engine for chains of separation constraints. This module
+requires NumPy.
+
+Author: G.J.J. van den Burg
+License: Apache-2.0
+"""
+
+import time
+
+import numpy as np
+
+from .vpsc import ChainSolver
+from .vpsc import Solver
+
+
+class ArraySolver(object):
+    """VPSC solver for a chain of separation constraints on NumPy arrays.
+
+    The problem is given by the desired positions, weights and scales of n
+    variables in chain order and the n - 1 gaps between consecutive
+    variables. Blocks are contiguous runs of the chain, so the block
+    positions, the slacks between blocks and the Lagrange multipliers of
+    the active constraints are all computed with vectorized operations.
+    Satisfying the constraints merges all violated neighbouring blocks at
+    once. If that does not settle within ``MAX_ROUNDS`` rounds, the
+    remaining blocks are pooled sequentially.
+
+    Independent chains can be solved together by concatenating them and
+    setting ``breaks[i]`` to True when variable i is the last of its chain.
+    The gap after such a variable is ignored.
+
+    Use :meth:`fromVariables` to solve a problem given as
+    :class:`~labella.vpsc.Variable` and :class:`~labella.vpsc.Constraint`
+    objects. The variables are then placed in blocks after solving, as with
+    :class:`~labella.vpsc.Solver`.
+    """
+
+    MAX_ROUNDS = 16
+
+    def __init__(
+        self,
+        desired,
+        gaps,
+        weights=None,
+        scales=None,
+        breaks=None,
+        stats=None,
+    ):
+        self.desired = np.array(desired, dtype=float)
+        n = len(self.desired)
+        self.gaps = np.array(gaps, dtype=float)
+        if len(self.gaps) != max(n - 1, 0):
+            raise ValueError("Expected %i gaps" % max(n - 1, 0))
+        if weights is None:
+            weights = np.ones(n)
+        if scales is None:
+            scales = np.ones(n)
+        self.weights = np.array(weights, dtype=float)
+        self.scales = np.array(scales, dtype=float)
+        if breaks is None:
+            self.breaks = np.zeros(max(n - 1, 0), dtype=bool)
+        else:
+            self.breaks = np.array(breaks, dtype=bool)
+            self.gaps[self.breaks] = 0
+        self.offsets = np.zeros(n)
+        self.offsets[1:] = np.cumsum(self.gaps)
+        self.active = np.zeros(max(n - 1, 0), dtype=bool)
+        self.order = None
+        self.perm = None
+        self.blocks = None
+        self.stats = stats
+        self.converged = None
+        self._positions = None
+
+    @classmethod
+    def fromVariables(cls, vs, cs, stats=None):
+        chain = ChainSolver.chainOrder(vs, cs)
+        if chain is None:
+            raise ValueError("Constraints do not form a chain")
+        order, gaps = chain
+        solver = cls(
+            [v.desiredPosition for v in order],
+            gaps,
+            weights=[v.weight for v in order],
+            scales=[v.scale for v in order],
+            stats=stats,
+        )
+        index = {id(v): i for i, v in enumerate(vs)}
+        solver.order = order
+        solver.perm = np.array([index[id(v)] for v in order], dtype=int)
+        return solver
+
+    def setDesiredPositions(self, ps):
+        """Set new desired positions, in the order of the variables given
+        to :meth:`fromVariables` or in chain order. The active constraints
+        of the previous solve are kept as a warm start."""
+        ps = np.array(ps, dtype=float)
+        if not self.perm is None:
+            ps = ps[self.perm]
+        if not self.order is None:
+            for v, p in zip(self.order, ps.tolist()):
+                v.desiredPosition = p
+        self.desired = ps
+
+    def starts(self):
+        """Index of the first variable of every block"""
+        return np.flatnonzero(np.concatenate(([True], ~self.active)))
+
+    def solve(self, tolerance=None, max_iterations=None, time_budget=None):
+        """Solve the problem and return the cost.
+
+        The limits work as in :meth:`~labella.vpsc.Solver.solve`: at most
+        ``max_iterations`` rounds of splitting and satisfying are done
+        within ``time_budget`` seconds, and every round ends with a
+        feasible solution. The rounds stop when no block needs to be split,
+        or when a round lowers the cost by less than ``tolerance``.
+        """
+        if tolerance is None:
+            tolerance = Solver.TOLERANCE
+        self.converged = True
+        n = len(self.desired)
+        if n == 0:
+            self._positions = np.zeros(0)
+            self.blocks = []
+            return 0
+        deadline = None
+        if not time_budget is None:
+            deadline = time.perf_counter() + time_budget
+
+        # Work with y = scale * position - offset, in which the
+        # constraints become y[i] <= y[i + 1] and every block has a single
+        # value: the weighted mean of t.
+        W = self.weights / (self.scales * self.scales)
+        t = self.scales * self.desired - self.offsets
+        self.satisfy(W, t)
+        rounds = 1
+        cost = self.blockCost(W, t)
+        while True:
+            if (not max_iterations is None and rounds >= max_iterations) or (
+                not deadline is None and time.perf_counter() >= deadline
+            ):
+                # Only report an early stop if there is work left to do
+                self.converged = not self.split(W, t, apply=False)
+                break
+            if not self.split(W, t):
+                break
+            self.satisfy(W, t)
+            rounds += 1
+            # Rounding errors in the Lagrange multipliers can split a block
+            # that is merged again in the same round, over and over.
+            lastcost = cost
+            cost = self.blockCost(W, t)
+            if lastcost - cost <= tolerance:
+                break
+
+        stats = self.stats
+        if not stats is None:
+            t0 = time.perf_counter()
+        starts = self.starts()
+        Y = np.add.reduceat(W * t, starts) / np.add.reduceat(W, starts)
+        sizes = np.diff(np.append(starts, n))
+        blk = np.repeat(np.arange(len(starts)), sizes)
+        self._positions = (Y[blk] + self.offsets) / self.scales
+        if not self.order is None:
+            self.blocks = ChainSolver.buildBlocks(
+                self.order, self.offsets.tolist(), starts.tolist()
+            )
+        cost = self.cost()
+        if not stats is None:
+            stats.addTime("blocks", time.perf_counter() - t0)
+            stats.maxBlockSize = max(stats.maxBlockSize, int(sizes.max()))
+            stats.cost += cost
+            if not self.converged:
+                stats.earlyStops += 1
+        return cost
+
+    def blockCost(self, W, t):
+        """Cost of the current blocks, computed in terms of y"""
+        starts = self.starts()
+        Y = np.add.reduceat(W * t, starts) / np.add.reduceat(W, starts)
+        d = np.repeat(Y, np.diff(np.append(starts, len(t)))) - t
+        return float(np.sum(W * d * d))
+
+    def satisfy(self, W, t):
+        stats = self.stats
+        if not stats is None:
+            t0 = time.perf_counter()
+            merged = int(self.active.sum())
+        self._satisfy(W, t)
+        if not stats is None:
+            stats.merges += int(self.active.sum()) - merged
+            stats.addTime("satisfy", time.perf_counter() - t0)
+
+    def _satisfy(self, W, t):
+        WT = W * t
+        for _ in range(self.MAX_ROUNDS):
+            if not self.stats is None:
+                self.stats.satisfyRounds += 1
+            starts = self.starts()
+            Y = np.add.reduceat(WT, starts) / np.add.reduceat(W, starts)
+            violated = np.diff(Y) < Solver.ZERO_UPPERBOUND
+            boundaries = starts[1:][violated] - 1
+            boundaries = boundaries[~self.breaks[boundaries]]
+            if len(boundaries) == 0:
+                return
+            self.active[boundaries] = True
+
+        # Merging is cascading slowly, pool the remaining blocks one by one
+        starts = self.starts()
+        sumW = np.add.reduceat(W, starts)
+        blockStarts, _, _ = ChainSolver.pool(
+            sumW.tolist(),
+            (np.add.reduceat(WT, starts) / sumW).tolist(),
+            breaks=self.breaks[starts[1:] - 1].tolist(),
+        )
+        poolStarts = starts[blockStarts]
+        self.active[:] = True
+        self.active[poolStarts[1:] - 1] = False
+
+    def split(self, W, t, apply=True):
+        """Split every block at its active constraint with the most negative
+        Lagrange multiplier, if that is below the tolerance. Returns whether
+        any block was split, or would be split if apply is False."""
+        stats = self.stats
+        if not stats is None:
+            t0 = time.perf_counter()
+        splits = self._split(W, t, apply)
+        if not stats is None:
+            if apply:
+                stats.splits += splits
+            stats.addTime("split", time.perf_counter() - t0)
+        return splits > 0
+
+    def _split(self, W, t, apply):
+        n = len(t)
+        if n < 2 or not self.active.any():
+            return 0
+        starts = self.starts()
+        sumW = np.add.reduceat(W, starts)
+        Y = np.add.reduceat(W * t, starts) / sumW
+        blk = np.concatenate(([0], np.cumsum(~self.active)))
+        ends = np.append(starts[1:], n) - 1
+
+        # The multiplier of the constraint between i and i + 1 is the sum
+        # of the derivatives of the variables to the right of i in the
+        # block.
+        C = np.cumsum(2.0 * W * (Y[blk] - t))
+        lm = C[ends[blk[:-1]]] - C[:-1]
+        lm[~self.active] = np.inf
+        cand = np.flatnonzero(lm < Solver.LAGRANGIAN_TOLERANCE)
+        if len(cand) == 0 or not apply:
+            return len(cand)
+        b = blk[cand]
+        idx = np.lexsort((lm[cand], b))
+        cand, b = cand[idx], b[idx]
+        first = np.concatenate(([True], b[1:] != b[:-1]))
+        self.active[cand[first]] = False
+        return int(first.sum())
+
+    def positions(self):
+        """Positions of the variables in chain order"""
+        return self._positions
+
+    def cost(self):
+        d = self._positions - self.desired
+        return float(np.sum(self.weights * d * d))
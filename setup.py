@@ -20,14 +20,16 @@ REQUIRES_PYTHON = ">=3.5.0"
 VERSION = None
 
 # What packages are required for this module to be executed?
-REQUIRED = ["intervaltree>=3.0.0"]
+REQUIRED = []
 
 docs_require = []
 test_require = []
 dev_require = ["green"]
+numpy_require = ["numpy"]
 
 # What packages are optional?
 EXTRAS = {
+    "numpy": numpy_require,
     "docs": docs_require,
     "tests": test_require,
     "dev": docs_require + test_require + dev_require,
@@ -1,3 +1,4 @@
+import random
 import unittest
 
 from labella.distributor import Distributor
@@ -181,6 +182,25 @@ class DistributorTestCase(unittest.TestCase):
         for i in range(len(exp_out)):
             self.assertEqual(exp_out[i], nodes[i].overlapCount)
 
+    def test_countIdealOverlaps_2(self):
+        rng = random.Random(1)
+        dist = Distributor()
+        nodes = [
+            Node(rng.randint(0, 200), rng.choice([1, 10, 20]))
+            for _ in range(100)
+        ]
+        indptr, indices = dist.countIdealOverlaps(nodes)
+        for i, node in enumerate(nodes):
+            expected = [
+                j
+                for j, other in enumerate(nodes)
+                if other.idealLeft() < node.idealRight()
+                and other.idealRight() > node.idealLeft()
+            ]
+            result = sorted(indices[indptr[i] : indptr[i + 1]])
+            self.assertEqual(result, expected)
+            self.assertEqual(node.overlapCount, len(expected))
+
     def test_algorithm_simple_1(self):
         options = {
             "algorithm": "simple",
@@ -295,6 +315,127 @@ class DistributorTestCase(unittest.TestCase):
         self.assertEqual(layers[2][3], nodedict[11])
         self.assertEqual(layers[2][4], nodedict[14])
 
+    def test_algorithm_roundRobin(self):
+        options = {
+            "algorithm": "roundRobin",
+            "layerWidth": 960,
+            "density": 0.85,
+            "nodeSpacing": 3,
+            "stubWidth": 1,
+        }
+        xs = [1, 2, 3, 3, 3, 304, 454, 454, 454, 804, 804, 804, 804, 854, 854]
+        nodes = [Node(x, 100) for x in xs]
+        dist = Distributor(options)
+        layers = dist.distribute(nodes)
+
+        self.assertEqual(len(layers), 2)
+        self.assertEqual(
+            [n for n in layers[0] if not n.isStub()],
+            [nodes[i] for i in [0, 2, 4, 5, 6, 9, 11, 13]],
+        )
+        self.assertEqual(
+            layers[1], [nodes[i] for i in [1, 3, 7, 8, 10, 12, 14]]
+        )
+        stubs = [n for n in layers[0] if n.isStub()]
+        self.assertEqual([n.child for n in stubs], layers[1])
+
+        # every node is placed once, and the layers stay sorted
+        nodes = [Node(x, 20) for x in range(0, 3000, 7)]
+        options["layerWidth"] = 1000
+        layers = Distributor(options).distribute(nodes)
+        self.assertEqual(len(layers), 4)
+        placed = [n for layer in layers for n in layer if not n.isStub()]
+        self.assertEqual(sorted(placed, key=nodes.index), nodes)
+        for layer in layers:
+            positions = [n.idealPos for n in layer]
+            self.assertEqual(positions, sorted(positions))
+
+        # layers that are left empty are dropped
+        nodes = [Node(x, 10) for x in range(0, 200, 20)]
+        dist = Distributor({"algorithm": "roundRobin", "layerWidth": 100})
+        self.assertEqual(dist.distribute(nodes), [nodes])
+        self.assertEqual(dist.estimate_layers(nodes), 1)
+
+    def test_algorithm_partition(self):
+        options = {"algorithm": "partition", "layerWidth": 200}
+        rng = random.Random(2)
+        for _ in range(20):
+            nodes = [
+                Node(rng.randint(0, 300), rng.choice([5, 10, 30]))
+                for _ in range(rng.randint(10, 60))
+            ]
+            layers = Distributor(options).distribute(nodes)
+
+            placed = [n for layer in layers for n in layer if not n.isStub()]
+            self.assertEqual(sorted(placed, key=nodes.index), nodes)
+            for layer in layers:
+                real = sorted(
+                    [n for n in layer if not n.isStub()],
+                    key=lambda n: n.idealLeft(),
+                )
+                for a, b in zip(real, real[1:]):
+                    self.assertLessEqual(a.idealRight() + 3, b.idealLeft())
+
+            # the number of layers is the largest number of nodes that
+            # overlap at a single point
+            depth = max(
+                sum(
+                    1
+                    for m in nodes
+                    if m.idealLeft() <= n.idealLeft() < m.idealRight() + 3
+                )
+                for n in nodes
+            )
+            self.assertEqual(len(layers), depth)
+
+        nodes = [Node(10, 10) for _ in range(5)]
+        options.update(layerWidth=20, maxLayers=2)
+        layers = Distributor(options).distribute(nodes)
+        self.assertEqual(len(layers), 2)
+        self.assertEqual([n for n in layers[0] if not n.isStub()], nodes[::2])
+        self.assertEqual(layers[1], nodes[1::2])
+
+    def test_estimate_layers(self):
+        rng = random.Random(3)
+        nodes = [
+            Node(rng.uniform(0, 1000), rng.choice([10, 20, 40]))
+            for _ in range(200)
+        ]
+        for algorithm in ["none", "simple", "roundRobin", "partition"]:
+            for layerWidth in [300, 1000, 10000]:
+                dist = Distributor(
+                    {"algorithm": algorithm, "layerWidth": layerWidth}
+                )
+                self.assertEqual(
+                    dist.estimate_layers(nodes),
+                    len(dist.distribute(nodes)),
+                )
+                for node in nodes:
+                    node.removeStub()
+
+        # nodes without width, which do not overlap without spacing
+        options = {"algorithm": "partition", "layerWidth": 100}
+        dist = Distributor(dict(options, nodeSpacing=0))
+        nodes = [Node(0, 100), Node(0, 100), Node(1000, 0)]
+        self.assertEqual(dist.estimate_layers(nodes), 2)
+        self.assertEqual(len(dist.distribute(nodes)), 2)
+        for spacing in [0, 3]:
+            dist = Distributor(dict(options, nodeSpacing=spacing))
+            for _ in range(20):
+                nodes = [
+                    Node(rng.randint(0, 100), rng.choice([0, 0, 10, 40]))
+                    for _ in range(30)
+                ]
+                self.assertEqual(
+                    dist.estimate_layers(nodes), len(dist.distribute(nodes))
+                )
+
+        dist = Distributor({"algorithm": "overlap", "layerWidth": 1000})
+        self.assertEqual(dist.estimate_layers([]), 0)
+        self.assertLessEqual(
+            dist.estimate_layers(nodes), len(dist.distribute(nodes))
+        )
+
     def test_algorithm_overlap_1(self):
         options = {
             "algorithm": "overlap",
@@ -411,6 +552,38 @@ class DistributorTestCase(unittest.TestCase):
         self.assertEqual(layers[2][2], nodedict[1])
         self.assertEqual(layers[2][3], nodedict[10])
 
+    def test_puntOverlapping(self):
+        def reference(dist, nodes, overlaps, width, maxWidth):
+            # the sort-based loop that puntOverlapping replaces
+            layer = nodes[:]
+            punted = []
+            while len(layer) > 2 and width > maxWidth:
+                layer.sort(key=lambda x: x.overlapCount, reverse=True)
+                first = layer.pop(0)
+                width += dist.options["stubWidth"] - first.width
+                i = nodes.index(first)
+                for j in overlaps[1][overlaps[0][i] : overlaps[0][i + 1]]:
+                    nodes[j].overlapCount -= 1
+                punted.append(first)
+            return layer, punted
+
+        rng = random.Random(0)
+        dist = Distributor({"layerWidth": 500})
+        for _ in range(50):
+            nodes = [
+                Node(rng.randint(0, 500), rng.choice([10, 20, 40]))
+                for _ in range(rng.randint(1, 80))
+            ]
+            nodes.sort(key=lambda x: x.idealPos)
+            width = dist.computeRequiredWidth(nodes)
+            maxWidth = dist.maxWidthPerLayer()
+            overlaps = dist.countIdealOverlaps(nodes)
+            expected = reference(dist, nodes, overlaps, width, maxWidth)
+            overlaps = dist.countIdealOverlaps(nodes)
+            result = dist.puntOverlapping(nodes, overlaps, width, maxWidth)
+            self.assertEqual(expected, result[:2])
+            self.assertEqual(result[2], dist.computeRequiredWidth(result[1]))
+
 
 if __name__ == "__main__":
     unittest.main()
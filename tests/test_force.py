@@ -1,8 +1,12 @@
+import gc
 import unittest
+import weakref
 
+from labella import metrics
 from labella.force import DEFAULT_OPTIONS
 from labella.force import Force
 from labella.node import Node
+from labella.node import NodeArray
 
 
 class ForceTestCase(unittest.TestCase):
@@ -73,6 +77,68 @@ class ForceTestCase(unittest.TestCase):
         ]
         self.assertEqual(current_pos, expected_pos)
 
+    def test_compute_NodeArray(self):
+        xs = [1, 2, 3, 3, 3, 304, 454, 454, 454, 804, 804, 804, 854, 854]
+        for algorithm in ["overlap", "simple", "none"]:
+            options = {"algorithm": algorithm, "layerWidth": 960}
+            nodes = [Node(x, 100) for x in xs]
+            force = Force(options)
+            force.nodes(nodes)
+            force.compute()
+            layers = [[] for _ in range(max(n.layerIndex for n in nodes) + 1)]
+            for node in nodes:
+                for hop in node.getPathToRoot():
+                    layers[hop.layerIndex].append(hop)
+
+            array = NodeArray(xs, [100] * len(xs))
+            force = Force(options)
+            force.nodes(array)
+            force.compute()
+            # the stubs of the first computation are removed
+            force.compute()
+            self.assertEqual(len(array), sum(len(layer) for layer in layers))
+            self.assertEqual(
+                [n.currentPos for n in nodes],
+                list(array.currentPos[: len(xs)]),
+            )
+            self.assertEqual(
+                [n.getLayerIndex() for n in nodes],
+                list(array.layerIndex[: len(xs)]),
+            )
+            for name in ["displacement", "pathLength", "overlapCount"]:
+                self.assertAlmostEqual(
+                    getattr(metrics, name)(layers),
+                    getattr(metrics, name)(array),
+                )
+
+    def test_compute_weakLinks(self):
+        xs = [1, 2, 3, 3, 3, 304, 454, 454, 454, 804, 804, 804, 854, 854]
+        result = []
+        for weakLinks in [False, True]:
+            nodes = [Node(x, 100) for x in xs]
+            force = Force({"maxPos": 960, "weakLinks": weakLinks})
+            force.nodes(nodes)
+            force.compute()
+            result.append(
+                [[hop.currentPos for hop in n.getPathToRoot()] for n in nodes]
+            )
+        self.assertEqual(result[0], result[1])
+
+        # the nodes and stubs are freed without the garbage collector
+        nodes = [Node(x, 100) for x in xs]
+        force = Force({"maxPos": 960, "weakLinks": True})
+        force.nodes(nodes)
+        gc.disable()
+        try:
+            force.compute()
+            refs = [
+                weakref.ref(hop) for n in nodes for hop in n.getPathToRoot()
+            ]
+            del force, nodes
+            self.assertEqual([r for r in refs if not r() is None], [])
+        finally:
+            gc.enable()
+
     def test_compute_2(self):
         # should respect the maxPos option
         nodes = [
@@ -126,6 +192,69 @@ class ForceTestCase(unittest.TestCase):
             self.assertGreater(node.currentRight(), 30)  # is this right?
             self.assertGreaterEqual(node.currentLeft(), 30)
 
+    def test_stats(self):
+        nodes = [Node(x, 50) for x in [1, 2, 3, 3, 304, 454, 454, 804]]
+        force = Force({"maxPos": 900})
+        force.nodes(nodes)
+        force.compute()
+        self.assertIsNone(force.getStats())
+
+        force = Force({"maxPos": 900, "stats": True, "algorithm": "none"})
+        force.nodes(nodes)
+        force.compute()
+        stats = force.getStats()
+        self.assertEqual(len(stats["layers"]), 1)
+        layer = stats["layers"][0]
+        self.assertGreater(layer["clusters"], 0)
+        self.assertEqual(layer["satisfyRounds"], layer["clusters"])
+        self.assertGreater(layer["merges"], 0)
+        self.assertEqual(layer["splits"], 0)
+        self.assertGreater(layer["maxBlockSize"], 1)
+        for phase in ["setup", "solve", "update"]:
+            self.assertIn(phase, layer["times"])
+        self.assertEqual(stats["total"]["merges"], layer["merges"])
+
+        # the statistics of a previous computation are not kept
+        force.set_options({"stats": False})
+        force.compute()
+        self.assertIsNone(force.getStats())
+
+    def test_limits(self):
+        nodes = [Node(x, 50) for x in [1, 2, 3, 3, 304, 454, 454, 804]]
+        options = {"timeBudget": 0, "maxIterations": 1, "algorithm": "none"}
+        force = Force(options)
+        force.nodes(nodes)
+        force.compute()
+        # the default solver is exact, so it is never stopped early
+        self.assertTrue(force.converged)
+        nodes = sorted(nodes, key=lambda n: n.currentPos)
+        for left, right in zip(nodes, nodes[1:]):
+            self.assertLessEqual(left.currentRight(), right.currentLeft())
+
+    def test_workers(self):
+        xs = [1, 2, 3, 3, 304, 454, 454, 804]
+        force = Force({"algorithm": "none"})
+        force.nodes([Node(x, 50) for x in xs])
+        force.compute()
+        expected = [n.currentPos for n in force.nodes()]
+
+        options = {"algorithm": "none", "workers": 2, "parallelMinSize": 2}
+        force = Force(options)
+        try:
+            force.nodes([Node(x, 50) for x in xs])
+            force.compute()
+            self.assertEqual([n.currentPos for n in force.nodes()], expected)
+            # the pool is kept for the next computation
+            pool = force._pool
+            self.assertIsNotNone(pool)
+            force.nodes([Node(x, 50) for x in xs])
+            force.compute()
+            self.assertIs(force.getPool(), pool)
+            self.assertEqual([n.currentPos for n in force.nodes()], expected)
+        finally:
+            force.close()
+        self.assertIsNone(force._pool)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,3 +1,4 @@
+import random
 import unittest
 
 from labella import metrics
@@ -82,6 +83,35 @@ class MetricsTestCase(unittest.TestCase):
         self.assertEqual(metrics.overlapSpace(nodes), 49 / 4)
         self.assertEqual(metrics.overlapSpace([nodes, nodes]), 49 * 2 / 8)
 
+    def test_overlap_sweep(self):
+        def pairwise(layer, buf):
+            count, space = 0, 0
+            for i in range(len(layer)):
+                for j in range(i + 1, len(layer)):
+                    if layer[i].overlapWithNode(layer[j], buf):
+                        count += 1
+                    distance = layer[i].distanceFrom(layer[j])
+                    space += abs(distance) if distance < 0 else 0
+            return count, space
+
+        random.seed(25)
+        for _ in range(50):
+            layer = []
+            for _ in range(random.randint(1, 60)):
+                node = Node(0, random.choice([0, 1, 7, 20.5, 33.3]))
+                node.currentPos = random.uniform(0, 300)
+                layer.append(node)
+            for buf in [None, 0, 2, 5.5, -3]:
+                count, space = pairwise(layer, buf)
+                self.assertEqual(metrics.overlapCount(layer, buf), count)
+            self.assertEqual(metrics.overlapSpace(layer), space / len(layer))
+
+        # a large layer of nodes that only overlap their neighbours
+        layer = [Node(i * 40, 50) for i in range(50000)]
+        self.assertEqual(metrics.overlapCount(layer), 49999)
+        self.assertEqual(metrics.overlapCount(layer, 31), 2 * 50000 - 3)
+        self.assertEqual(metrics.overlapSpace(layer), 10 * 49999 / 50000)
+
     def test_weightedAllocation(self):
         nodes = [Node(0, 50), Node(50, 50), Node(800, 50), Node(801, 50)]
         # should return 0 if the input is empty
@@ -1,6 +1,15 @@
+import gc
+import pickle
 import unittest
+import weakref
+
+from array import array
 
 from labella.node import Node
+from labella.node import NodeArray
+from labella.node import Stub
+from labella.node import cachePaths
+from labella.node import pathLengths
 
 
 class NodeTestCase(unittest.TestCase):
@@ -95,6 +104,48 @@ class NodeTestCase(unittest.TestCase):
         self.assertEqual(n1.idealPos, stub.idealPos)
         self.assertEqual(n1.data, stub.data)
 
+    def test_createStub_compact(self):
+        n1 = Node(10, 10, data="a")
+        n1.currentPos = 12
+        stub = n1.createStub(5).createStub(1)
+        self.assertIsInstance(stub, Stub)
+        self.assertIs(stub.child.child, n1)
+        self.assertEqual(stub.currentPos, 12)
+        self.assertEqual(stub.data, "a")
+        self.assertEqual(stub.overlapCount, 0)
+        self.assertIsNone(stub.x)
+        self.assertFalse(hasattr(stub, "__dict__") and stub.__dict__)
+        stub.x = 3
+        self.assertEqual(stub.x, 3)
+        self.assertIsNone(n1.createStub(1).x)
+
+    def test_createStub_weak(self):
+        n1 = Node(854, 50)
+        n1.currentPos = 800
+        n2 = n1.createStub(weak=True)
+        n2.currentPos = 700
+        n3 = n2.createStub(weak=True)
+        self.assertIs(n2.child, n1)
+        self.assertEqual(n1.getPathToRoot(), [n1, n2, n3])
+        self.assertIs(n1.getRoot(), n3)
+        self.assertEqual(n1.getPathToRootLength(), 254)
+
+        # without cycles the nodes are freed without the garbage collector
+        gc.disable()
+        try:
+            ref = weakref.ref(n1)
+            del n1, n2, n3
+            self.assertIsNone(ref())
+        finally:
+            gc.enable()
+
+        nodes = [Node(10, 10), Node(12, 10)]
+        layers = [[nodes[0].createStub(1, weak=True)], nodes]
+        layers = pickle.loads(pickle.dumps(layers))
+        self.assertIs(layers[0][0].child, layers[1][0])
+        self.assertIs(layers[1][0].parent, layers[0][0])
+        self.assertTrue(layers[0][0].weak)
+
     def test_removeStub(self):
         n1 = Node(10, 10)
         stub = n1.createStub(5)
@@ -137,6 +188,47 @@ class NodeTestCase(unittest.TestCase):
         n3 = n2.createStub(5)
         self.assertEqual(n1.getRoot(), n3)
 
+    def test_cachePath(self):
+        n1 = Node(854, 50)
+        n1.currentPos = 800
+        n2 = n1.createStub()
+        n2.currentPos = 700
+        cachePaths([n1, n2])
+        self.assertEqual(n1.getPathToRoot(), [n1, n2])
+        self.assertEqual(n1.getPathFromRoot(), [n2, n1])
+        self.assertIs(n1.getRoot(), n2)
+
+        # positions are not cached
+        n2.currentPos = 750
+        self.assertEqual(pathLengths([n1, n2]), [154, 104])
+
+        # creating a stub above the chain clears the cache below it
+        n3 = n2.createStub()
+        self.assertIs(n1.getRoot(), n3)
+        self.assertEqual(n2.getPathToRoot(), [n2, n3])
+        n1.cachePath()
+        n2.removeStub()
+        self.assertEqual(n1.getPathToRoot(), [n1, n2])
+        self.assertIs(n1.getRoot(), n2)
+
+    def test_pathLengths(self):
+        nodes = []
+        for i, x in enumerate([10, 250, 400]):
+            node = Node(x, 50)
+            node.currentPos = x + 3
+            current = node
+            for depth in range(i):
+                current = current.createStub()
+                current.currentPos = x - 7 * depth
+            nodes.append(node)
+        # every node and stub, with the stubs after the nodes below them
+        hops = [hop for n in nodes for hop in n.getPathToRoot()]
+        self.assertEqual(
+            pathLengths(hops), [n.getPathToRootLength() for n in hops]
+        )
+        self.assertEqual(pathLengths(hops[::-1]), pathLengths(hops)[::-1])
+        self.assertEqual(pathLengths([]), [])
+
     def test_getLayerIndex(self):
         n1 = Node(10, 10)
         self.assertEqual(n1.getLayerIndex(), 0)
@@ -154,6 +246,66 @@ class NodeTestCase(unittest.TestCase):
         self.assertEqual(n2.currentPos, 20)
         self.assertEqual(n2.layerIndex, 3)
 
+    def test_slots(self):
+        n1 = Node(10, 10)
+        n1.targetPos = 12
+        with self.assertRaises(AttributeError):
+            n1.overlaps = []
+
+    def test_NodeArray(self):
+        nodes = NodeArray([10, 30], [10, 20], data=["a", "b"])
+        self.assertEqual(len(nodes), 2)
+        n1 = nodes[0]
+        self.assertEqual(n1, nodes[0])
+        self.assertNotEqual(n1, nodes[1])
+        self.assertEqual(nodes[-1], nodes[1])
+        self.assertEqual(n1.idealPos, 10)
+        self.assertEqual(n1.data, "a")
+        self.assertEqual(n1.idealRight(), 15)
+        n1.currentPos = 12
+        self.assertEqual(nodes.currentPos[0], 12)
+        self.assertEqual(n1.displacement(), -2)
+
+        stub = n1.createStub(5)
+        self.assertEqual(len(nodes), 3)
+        self.assertEqual(stub, nodes[2])
+        self.assertEqual(stub.width, 5)
+        self.assertEqual(stub.currentPos, 12)
+        self.assertTrue(stub.isStub())
+        self.assertFalse(n1.isStub())
+        self.assertEqual(n1.getRoot(), stub)
+        self.assertEqual(n1.getPathFromRoot(), [stub, n1])
+
+        stub.layerIndex = 1
+        self.assertEqual(nodes.layers(), [[n1, nodes[1]], [stub]])
+        nodes.removeStubs()
+        self.assertEqual(len(nodes), 2)
+        self.assertIsNone(nodes[0].parent)
+        self.assertEqual(list(nodes.data), ["a", "b"])
+        with self.assertRaises(IndexError):
+            nodes[2]
+
+    def test_from_arrays(self):
+        columns = [
+            ([1, 2.5], [10, 20]),
+            (array("d", [1, 2.5]), array("l", [10, 20])),
+        ]
+        try:
+            import numpy as np
+        except ImportError:
+            pass
+        else:
+            columns.append((np.array([1, 2.5]), np.array([10, 20])))
+            columns.append((np.array([0, 1, 2.5])[1:], np.array([10, 20])))
+        for ideal, widths in columns:
+            nodes = NodeArray.from_arrays(ideal, widths, data="ab")
+            self.assertEqual(list(nodes.idealPos), [1, 2.5])
+            self.assertEqual(list(nodes.currentPos), [1, 2.5])
+            self.assertEqual(list(nodes.width), [10, 20])
+            self.assertEqual(nodes[1].data, "b")
+        with self.assertRaises(ValueError):
+            NodeArray.from_arrays([1, 2], [10])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,151 @@
+import random
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from labella import vpsc
+from labella.node import Node
+from labella.removeOverlap import SOLVERS
+from labella.removeOverlap import removeOverlap
+from labella.removeOverlap import removeOverlapBatch
+
+
+def make_layers(seed, count):
+    rng = random.Random(seed)
+    layers = []
+    for _ in range(count):
+        n = rng.randint(0, 20)
+        layers.append(
+            [
+                Node(rng.uniform(0, 300), rng.choice([10, 20, 35]))
+                for _ in range(n)
+            ]
+        )
+    return layers
+
+
+class RemoveOverlapTestCase(unittest.TestCase):
+    def test_solvers(self):
+        options = {"minPos": 0, "maxPos": 250}
+        for solver in SOLVERS:
+            layers = make_layers(1, 10)
+            expected = [
+                [n.currentPos for n in removeOverlap(nodes, options)]
+                for nodes in layers
+            ]
+            layers = make_layers(1, 10)
+            result = [
+                [
+                    n.currentPos
+                    for n in removeOverlap(nodes, dict(options, solver=solver))
+                ]
+                for nodes in layers
+            ]
+            self.assertEqual(expected, result)
+
+    def test_decompose(self):
+        for seed in range(10):
+            for options in [{}, {"maxPos": 250}, {"minPos": None}]:
+                for solver in SOLVERS:
+                    opts = dict(options, solver=solver, decompose=False)
+                    layers = make_layers(seed, 5)
+                    expected = [
+                        [n.currentPos for n in removeOverlap(nodes, opts)]
+                        for nodes in layers
+                    ]
+                    opts["decompose"] = True
+                    layers = make_layers(seed, 5)
+                    result = [
+                        [n.currentPos for n in removeOverlap(nodes, opts)]
+                        for nodes in layers
+                    ]
+                    self.assertEqual(expected, result)
+
+    def test_decompose_cost(self):
+        # the cost of a layer is the sum of the costs of its clusters
+        xs = [100, 100, 100, 400, 400, 400]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for solver in SOLVERS:
+                costs = []
+                for options in [
+                    {"decompose": False},
+                    {"decompose": True},
+                    {"executor": executor, "parallelMinSize": 2},
+                ]:
+                    stats = vpsc.SolverStats()
+                    nodes = [Node(x, 50) for x in xs]
+                    removeOverlap(nodes, dict(options, solver=solver), stats)
+                    costs.append(stats.cost)
+                self.assertGreater(costs[0], 0)
+                for cost in costs[1:]:
+                    self.assertAlmostEqual(cost, costs[0])
+
+    def test_decompose_pileup(self):
+        # the node at 126 is far enough from its neighbour at its target,
+        # but not from the pile of nodes before it
+        nodes = [Node(x, 10) for x in [100, 100, 100, 100, 126, 200, 300]]
+        stats = vpsc.SolverStats()
+        removeOverlap(nodes, {"minPos": None}, stats=stats)
+        self.assertEqual(
+            [n.currentPos for n in nodes], [79, 92, 105, 118, 131, 200, 300]
+        )
+        self.assertEqual(stats.clusters, 1)
+        self.assertEqual(stats.maxBlockSize, 5)
+
+    def test_feasible(self):
+        nodes = [Node(x, 10) for x in [20.4, 40, 53]]
+        stats = vpsc.SolverStats()
+        removeOverlap(nodes, {"maxPos": 58}, stats=stats)
+        self.assertEqual([n.currentPos for n in nodes], [20, 40, 53])
+        self.assertEqual(stats.feasible, 1)
+        self.assertEqual(stats.clusters, 0)
+
+        # the last node is too close to the wall
+        nodes = [Node(x, 10) for x in [20, 40, 53]]
+        stats = vpsc.SolverStats()
+        removeOverlap(nodes, {"maxPos": 57}, stats=stats)
+        self.assertEqual(stats.feasible, 0)
+        self.assertEqual([n.currentPos for n in nodes], [20, 39, 52])
+
+    def test_executor(self):
+        layers = make_layers(3, 10)
+        expected = [
+            [n.currentPos for n in removeOverlap(nodes, {})]
+            for nodes in layers
+        ]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            options = {"executor": executor, "parallelMinSize": 3}
+            for solver in SOLVERS:
+                layers = make_layers(3, 10)
+                result = []
+                for nodes in layers:
+                    stats = vpsc.SolverStats()
+                    removeOverlap(nodes, dict(options, solver=solver), stats)
+                    result.append([n.currentPos for n in nodes])
+                    if stats.clusters:
+                        self.assertGreater(stats.satisfyRounds, 0)
+                self.assertEqual(expected, result)
+
+    def test_batch(self):
+        for options in [{}, {"maxPos": 250}, {"minPos": None}]:
+            layers = make_layers(2, 30)
+            expected = [
+                [n.currentPos for n in removeOverlap(nodes, options)]
+                for nodes in layers
+            ]
+            for solver in SOLVERS:
+                layers = make_layers(2, 30)
+                timings = {}
+                result = removeOverlapBatch(
+                    layers, dict(options, solver=solver), timings=timings
+                )
+                self.assertEqual(
+                    expected, [[n.currentPos for n in l] for l in result]
+                )
+                self.assertEqual(timings["problems"], 30)
+                self.assertEqual(timings["nodes"], sum(len(l) for l in layers))
+                self.assertGreaterEqual(timings["solve"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import random
 import unittest
 
 from labella import vpsc
@@ -22,6 +23,30 @@ def make_constraints(constraints, vs):
     return cs
 
 
+def reference_cost(variables, constraints, sweeps=100000):
+    # Hildreth's method: coordinate ascent on the dual of the problem
+    xs = [v["desiredPosition"] for v in variables]
+    lms = [0] * len(constraints)
+    for _ in range(sweeps):
+        change = 0
+        for k, con in enumerate(constraints):
+            l, r = con["left"], con["right"]
+            wl, wr = variables[l]["weight"], variables[r]["weight"]
+            slack = xs[r] - xs[l] - con["gap"]
+            lm = max(0, lms[k] - slack / (1 / wl + 1 / wr))
+            step = lm - lms[k]
+            lms[k] = lm
+            xs[l] -= step / wl
+            xs[r] += step / wr
+            change = max(change, abs(step))
+        if change < 1e-12:
+            break
+    return sum(
+        v["weight"] * (x - v["desiredPosition"]) ** 2
+        for v, x in zip(variables, xs)
+    )
+
+
 class VpscTestCase(unittest.TestCase):
 
     PRECISION = 4
@@ -237,6 +262,286 @@ class VpscTestCase(unittest.TestCase):
         rnd_exp, rnd_res = self.get_solution(variables, constraints, expected)
         self.assertEqual(rnd_exp, rnd_res)
 
+    def test_large_block(self):
+        # traversals of a single large block should not hit the recursion
+        # limit
+        n = 5000
+        vs = make_variables([0] * n)
+        cs = make_constraints(
+            [{"left": i, "right": i + 1, "gap": 1} for i in range(n - 1)], vs
+        )
+        vpsc.Solver(vs, cs)
+        bs = vpsc.Blocks(vs)
+        for c in cs:
+            bs.merge(c)
+        block = vs[0].block
+        self.assertEqual(len(block.vars), n)
+        self.assertTrue(block.isActiveDirectedPathBetween(vs[0], vs[-1]))
+        self.assertFalse(block.isActiveDirectedPathBetween(vs[-1], vs[0]))
+        self.assertGreater(block.findMinLM().lm, 0)
+        split = block.splitBetween(vs[0], vs[-1])
+        self.assertEqual(
+            len(split["lb"].vars) + len(split["rb"].vars), len(vs)
+        )
+
+    def test_most_violated(self):
+        vs = make_variables([0, 0, 5, 1])
+        cs = make_constraints(
+            [
+                {"left": 0, "right": 1, "gap": 1},
+                {"left": 1, "right": 2, "gap": 1},
+                {"left": 2, "right": 3, "gap": 1},
+            ],
+            vs,
+        )
+        solver = vpsc.Solver(vs, cs)
+        solver.bs = vpsc.Blocks(vs)
+        c = solver.mostViolated()
+        self.assertIs(c, cs[2])
+        self.assertNotIn(c, solver.inactive)
+        self.assertEqual(len(solver.inactive), 2)
+        c = solver.mostViolated()
+        self.assertIs(c, cs[0])
+        self.assertNotIn(c, solver.inactive)
+        # the remaining constraint is satisfied and is not removed
+        c = solver.mostViolated()
+        self.assertIs(c, cs[1])
+        self.assertIn(c, solver.inactive)
+
+    def test_blocks_remove(self):
+        vs = make_variables([0, 1, 2, 3])
+        bs = vpsc.Blocks(vs)
+        blocks = list(bs)
+        self.assertEqual(len(bs), 4)
+        seen = []
+        for b in bs:
+            seen.append(b)
+            if b is blocks[0]:
+                bs.remove(blocks[0])
+                bs.remove(blocks[2])
+                new = vpsc.Block(vpsc.Variable(4))
+                bs.insert(new)
+        # blocks inserted while iterating are visited at the end
+        self.assertEqual(seen, [blocks[0], blocks[1], blocks[3], new])
+        self.assertEqual(len(bs), 3)
+        self.assertEqual(blocks[0].blockInd, -1)
+        self.assertEqual(blocks[2].blockInd, -1)
+        for i, b in enumerate(bs):
+            self.assertEqual(b.blockInd, i)
+
+    def test_incremental_cost(self):
+        vs = make_variables([9, 0, 7, 1, 6, 2, 5, 3, 4, 8])
+        cs = make_constraints(
+            [{"left": i, "right": i + 1, "gap": 2} for i in range(9)]
+            + [{"left": 0, "right": 9, "gap": 5}],
+            vs,
+        )
+        solver = vpsc.Solver(vs, cs)
+        cost = solver.solve()
+        self.assertAlmostEqual(cost, solver.cost())
+        self.assertAlmostEqual(cost, solver.cost(recompute=True))
+        expected = sum(
+            v.weight * (v.position() - v.desiredPosition) ** 2 for v in vs
+        )
+        self.assertAlmostEqual(cost, expected)
+
+    def test_warm_start(self):
+        constraints = [{"left": i, "right": i + 1, "gap": 3} for i in range(5)]
+        vs = make_variables([0, 1, 2, 10, 11, 20])
+        cs = make_constraints(constraints, vs)
+        solver = vpsc.Solver(vs, cs)
+        solver.solve()
+        for desired in ([1, 1, 3, 9, 12, 20], [0, 5, 6, 7, 8, 30]):
+            solver.setDesiredPositions(desired)
+            solver.solve()
+            cold_vs = make_variables(desired)
+            cold_cs = make_constraints(constraints, cold_vs)
+            vpsc.Solver(cold_vs, cold_cs).solve()
+            self.assertEqual(
+                [round(v.position(), self.PRECISION) for v in cold_vs],
+                [round(v.position(), self.PRECISION) for v in vs],
+            )
+            self.assertAlmostEqual(solver.cost(), solver.cost(recompute=True))
+
+    def test_starting_positions(self):
+        vs = make_variables([0, 1, 2])
+        cs = make_constraints(
+            [
+                {"left": 0, "right": 1, "gap": 3},
+                {"left": 1, "right": 2, "gap": 3},
+            ],
+            vs,
+        )
+        solver = vpsc.Solver(vs, cs)
+        solver.setStartingPositions([5, 6, 7])
+        solver.solve()
+        self.assertEqual(
+            [round(v.position(), self.PRECISION) for v in vs], [-2, 1, 4]
+        )
+
+    def test_stats(self):
+        vs = make_variables([0, 0, 0, 10])
+        cs = make_constraints(
+            [
+                {"left": 0, "right": 1, "gap": 2},
+                {"left": 1, "right": 2, "gap": 2},
+                {"left": 2, "right": 3, "gap": 2},
+            ],
+            vs,
+        )
+        stats = vpsc.SolverStats()
+        cost = vpsc.Solver(vs, cs, stats=stats).solve()
+        self.assertEqual(stats.merges, 2)
+        self.assertEqual(stats.maxBlockSize, 3)
+        self.assertEqual(stats.unsatisfiable, 0)
+        self.assertGreaterEqual(stats.satisfyRounds, 1)
+        self.assertGreaterEqual(stats.mostViolatedCalls, 3)
+        self.assertEqual(stats.cost, cost)
+        self.assertIn("split", stats.times)
+        self.assertIn("satisfy", stats.times)
+
+        total = vpsc.SolverStats().add(stats).add(stats)
+        self.assertEqual(total.merges, 4)
+        self.assertEqual(total.maxBlockSize, 3)
+        self.assertEqual(total.toDict()["cost"], 2 * cost)
+
+    def test_bounded_solve(self):
+        rng = random.Random(0)
+        n = 200
+        variables = [rng.uniform(0, 100) for _ in range(n)]
+        constraints = []
+        for _ in range(n):
+            left, right = rng.randrange(n), rng.randrange(n)
+            if left != right:
+                constraints.append({"left": left, "right": right, "gap": 1})
+
+        for kwargs in [{"max_iterations": 1}, {"time_budget": 0}]:
+            vs = [vpsc.Variable(p) for p in variables]
+            cs = make_constraints(constraints, vs)
+            stats = vpsc.SolverStats()
+            solver = vpsc.Solver(vs, cs, stats=stats)
+            solver.solve(**kwargs)
+            self.assertFalse(solver.converged)
+            self.assertEqual(stats.satisfyRounds, 1)
+            self.assertEqual(stats.earlyStops, 1)
+            for c in cs:
+                if not c.unsatisfiable:
+                    self.assertGreater(c.slack(), -1e-6)
+
+        vs = [vpsc.Variable(p) for p in variables]
+        cs = make_constraints(constraints, vs)
+        solver = vpsc.Solver(vs, cs)
+        solver.solve(tolerance=1e-8)
+        self.assertTrue(solver.converged)
+
+    def test_many_constraints(self):
+        n = 2000
+        vs = make_variables([(i * 7) % 50 for i in range(n)])
+        cs = make_constraints(
+            [{"left": i, "right": i + 1, "gap": 2} for i in range(n - 1)], vs
+        )
+        vpsc.Solver(vs, cs).solve()
+        for c in cs:
+            self.assertGreater(c.slack(), -1e-6)
+
+    def test_optimal(self):
+        # random problems that are not chains, the solver should not stop
+        # while a block can still be split
+        random.seed(3)
+        for _ in range(100):
+            n = random.randint(2, 25)
+            variables = [
+                {
+                    "desiredPosition": random.randint(0, 20),
+                    "weight": random.choice([1, 2]),
+                }
+                for _ in range(n)
+            ]
+            order = random.sample(range(n), n)
+            constraints = []
+            for _ in range(random.randint(1, 6 * n)):
+                i, j = sorted(random.sample(range(n), 2))
+                constraints.append(
+                    {
+                        "left": order[i],
+                        "right": order[j],
+                        "gap": random.choice([1, 2, 5]),
+                    }
+                )
+            vs = make_variables(variables)
+            cs = make_constraints(constraints, vs)
+            cost = vpsc.Solver(vs, cs).solve()
+            expected = reference_cost(variables, constraints)
+            self.assertAlmostEqual(cost, expected, delta=1e-6 * expected)
+
+
+class ChainSolverTestCase(unittest.TestCase):
+
+    PRECISION = 4
+
+    def assertSameAsSolver(self, variables, constraints):
+        vs = make_variables(variables)
+        cs = make_constraints(constraints, vs)
+        vpsc.Solver(vs, cs).solve()
+        expected = [round(v.position(), self.PRECISION) for v in vs]
+
+        vs = make_variables(variables)
+        cs = make_constraints(constraints, vs)
+        vpsc.ChainSolver(vs, cs).solve()
+        result = [round(v.position(), self.PRECISION) for v in vs]
+        self.assertEqual(expected, result)
+
+    def test_simple_scale(self):
+        variables = [
+            {"desiredPosition": 1, "weight": 1, "scale": 3},
+            {"desiredPosition": 1, "weight": 1, "scale": 2},
+            {"desiredPosition": 1, "weight": 1, "scale": 4},
+        ]
+        constraints = [
+            {"left": 0, "right": 1, "gap": 2},
+            {"left": 1, "right": 2, "gap": 2},
+        ]
+        self.assertSameAsSolver(variables, constraints)
+
+    def test_unordered_chain(self):
+        variables = [6, 0, 0, 5, 9]
+        constraints = [
+            {"left": 2, "right": 4, "gap": 3},
+            {"left": 1, "right": 3, "gap": 3},
+            {"left": 3, "right": 0, "gap": 2},
+            {"left": 0, "right": 2, "gap": 3},
+        ]
+        self.assertSameAsSolver(variables, constraints)
+
+    def test_walls(self):
+        variables = [
+            {"desiredPosition": 0, "weight": 1e10},
+            {"desiredPosition": 1},
+            {"desiredPosition": 2},
+            {"desiredPosition": 9},
+            {"desiredPosition": 10, "weight": 1e10},
+        ]
+        constraints = [
+            {"left": 1, "right": 2, "gap": 4},
+            {"left": 2, "right": 3, "gap": 4},
+            {"left": 0, "right": 1, "gap": 1},
+            {"left": 3, "right": 4, "gap": 1},
+        ]
+        self.assertSameAsSolver(variables, constraints)
+
+    def test_not_a_chain(self):
+        vs = make_variables([0, 1, 2])
+        cs = make_constraints(
+            [
+                {"left": 0, "right": 1, "gap": 3},
+                {"left": 0, "right": 2, "gap": 3},
+            ],
+            vs,
+        )
+        self.assertFalse(vpsc.ChainSolver.isChain(vs, cs))
+        with self.assertRaises(ValueError):
+            vpsc.ChainSolver(vs, cs)
+
 
 if __name__ == "__main__":
     unittest.main()
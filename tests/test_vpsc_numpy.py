@@ -0,0 +1,168 @@
+import random
+import unittest
+
+from labella import vpsc
+
+try:
+    import numpy as np
+
+    from labella.vpsc_numpy import ArraySolver
+except ImportError:
+    np = None
+
+from .test_vpsc import make_constraints
+from .test_vpsc import make_variables
+
+
+@unittest.skipIf(np is None, "NumPy is not available")
+class ArraySolverTestCase(unittest.TestCase):
+
+    PRECISION = 4
+
+    def solve(self, solver, variables, constraints):
+        vs = make_variables(variables)
+        cs = make_constraints(constraints, vs)
+        solver(vs, cs).solve()
+        return [round(v.position(), self.PRECISION) for v in vs]
+
+    def assertSameAsSolver(self, variables, constraints):
+        self.assertEqual(
+            self.solve(vpsc.Solver, variables, constraints),
+            self.solve(ArraySolver.fromVariables, variables, constraints),
+        )
+
+    def test_simple_scale(self):
+        variables = [
+            {"desiredPosition": 1, "weight": 1, "scale": 3},
+            {"desiredPosition": 1, "weight": 1, "scale": 2},
+            {"desiredPosition": 1, "weight": 1, "scale": 4},
+        ]
+        constraints = [
+            {"left": 0, "right": 1, "gap": 2},
+            {"left": 1, "right": 2, "gap": 2},
+        ]
+        self.assertSameAsSolver(variables, constraints)
+
+    def test_walls(self):
+        variables = [
+            {"desiredPosition": 0, "weight": 1e10},
+            {"desiredPosition": 1},
+            {"desiredPosition": 2},
+            {"desiredPosition": 9},
+            {"desiredPosition": 10, "weight": 1e10},
+        ]
+        constraints = [
+            {"left": 1, "right": 2, "gap": 4},
+            {"left": 2, "right": 3, "gap": 4},
+            {"left": 0, "right": 1, "gap": 1},
+            {"left": 3, "right": 4, "gap": 1},
+        ]
+        self.assertSameAsSolver(variables, constraints)
+
+    def test_random(self):
+        rng = random.Random(42)
+        for _ in range(50):
+            n = rng.randint(1, 30)
+            variables = [
+                {
+                    "desiredPosition": rng.uniform(0, 20),
+                    "weight": rng.choice([0.5, 1, 2]),
+                    "scale": rng.choice([1, 2, 3]),
+                }
+                for _ in range(n)
+            ]
+            constraints = [
+                {"left": i, "right": i + 1, "gap": rng.uniform(0, 3)}
+                for i in range(n - 1)
+            ]
+            self.assertSameAsSolver(variables, constraints)
+
+    def test_arrays(self):
+        solver = ArraySolver([0, 0, 5, 6], [2, 2, 2])
+        cost = solver.solve()
+        positions = [round(x, self.PRECISION) for x in solver.positions()]
+        self.assertEqual(positions, [-1.0, 1.0, 4.5, 6.5])
+        self.assertAlmostEqual(cost, 2.5)
+
+    def test_sequential_pooling(self):
+        # each round of merging only reaches one block further
+        n = 100
+        desired = list(range(n - 1)) + [-1000]
+        solver = ArraySolver(desired, [0] * (n - 1))
+        solver.MAX_ROUNDS = 2
+        solver.solve()
+        reference = vpsc.ChainSolver(*self.chain(desired))
+        reference.solve()
+        self.assertTrue(
+            np.allclose(
+                solver.positions(),
+                [v.position() for v in reference.order],
+            )
+        )
+
+    def test_warm_start(self):
+        solver = ArraySolver([0, 1, 2, 10, 11, 20], [3] * 5)
+        solver.solve()
+        for desired in ([1, 1, 3, 9, 12, 20], [0, 5, 6, 7, 8, 30]):
+            solver.setDesiredPositions(desired)
+            solver.solve()
+            reference = vpsc.Solver(*self.chain(desired, gap=3))
+            reference.solve()
+            self.assertTrue(
+                np.allclose(
+                    solver.positions(),
+                    [v.position() for v in reference.vs],
+                )
+            )
+
+    def test_warm_start_variables(self):
+        vs, cs = self.chain([0, 1, 2], gap=3)
+        solver = ArraySolver.fromVariables(vs, cs)
+        solver.solve()
+        solver.setDesiredPositions([10, 20, 30])
+        solver.solve()
+        self.assertEqual([v.desiredPosition for v in vs], [10, 20, 30])
+        self.assertEqual(
+            [round(v.position(), self.PRECISION) for v in vs], [10, 20, 30]
+        )
+        solver.setDesiredPositions([5, 5, 5])
+        solver.solve()
+        self.assertEqual(
+            [round(v.position(), self.PRECISION) for v in vs], [2, 5, 8]
+        )
+
+    def test_rounding(self):
+        # the multipliers are too noisy to decide on a split, which should
+        # not keep the solver splitting and merging the same blocks
+        solver = ArraySolver(
+            [-20, 10, 0], [3, 10], weights=[0.001, 1e10, 1], scales=[0.1] * 3
+        )
+        self.assertAlmostEqual(solver.solve(), 12100, places=4)
+        self.assertTrue(solver.converged)
+
+    def test_not_a_chain(self):
+        vs = make_variables([0, 1, 2])
+        cs = make_constraints(
+            [
+                {"left": 0, "right": 1, "gap": 3},
+                {"left": 0, "right": 2, "gap": 3},
+            ],
+            vs,
+        )
+        with self.assertRaises(ValueError):
+            ArraySolver.fromVariables(vs, cs)
+
+    def chain(self, desired, gap=0):
+        vs = make_variables(desired)
+        cs = make_constraints(
+            [
+                {"left": i, "right": i + 1, "gap": gap}
+                for i in range(len(vs) - 1)
+            ],
+            vs,
+        )
+        return vs, cs
+
+
+if __name__ == "__main__":
+    unittest.main()